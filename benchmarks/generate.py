@@ -0,0 +1,134 @@
+# benchmarks/generate.py
+"""Build a fake Unraid layout (/mnt/diskN plus pools) for benchmarking.
+
+Files are sparse: each one gets a short header that makes its content unique
+and is then truncated to its size, so large trees take little space and
+little time to create while scans still see real sizes and content.
+
+    python -m benchmarks.generate /tmp/bench --disks 4 --files 20000
+"""
+import os, random, argparse, json
+
+EXTENSIONS = (".mkv", ".mp4", ".srt", ".nfo", ".jpg", ".flac")
+
+class TreeSpec:
+    """Shape of a generated tree. Every field can be set from the command line."""
+
+    def __init__(self, disks=3, pools=1, files=2000, dup_ratio=0.2, renamed_ratio=0.1,
+                 copies=2, depth=3, fanout=8, sizes="lognormal:12,2", seed=1):
+        self.disks = disks
+        self.pools = pools
+        self.files = files
+        self.dup_ratio = dup_ratio
+        self.renamed_ratio = renamed_ratio
+        self.copies = copies
+        self.depth = depth
+        self.fanout = fanout
+        self.sizes = sizes
+        self.seed = seed
+
+    def as_dict(self):
+        return dict(vars(self))
+
+def size_sampler(spec, rng):
+    """Parse fixed:N, uniform:MIN,MAX or lognormal:MU,SIGMA (natural log of bytes)."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return lambda: int(values[0])
+    if kind == "uniform":
+        return lambda: rng.randint(int(values[0]), int(values[1]))
+    if kind == "lognormal":
+        # Cap at 64 GB so a long tail doesn't produce absurd sizes
+        return lambda: min(int(rng.lognormvariate(values[0], values[1])), 64 << 30)
+    raise ValueError(f"Unknown size distribution: {spec}")
+
+def write_file(path, size, header):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        data = header[:size]
+        f.write(data)
+        if size > len(data):
+            f.truncate(size)
+
+def random_rel_path(rng, spec, index):
+    parts = [f"Share{rng.randrange(2)}"]
+    for _ in range(rng.randint(1, spec.depth)):
+        parts.append(f"dir{rng.randrange(spec.fanout)}")
+    parts.append(f"file{index}{rng.choice(EXTENSIONS)}")
+    return os.path.join(*parts)
+
+def generate_tree(root, spec):
+    """Create root/mnt/disk1..N and root/mnt/poolN. Returns counts of what was written.
+
+    Each disk gets spec.files files of its own. dup_ratio of them are copied
+    to other disks (copies extra copies each), mostly under the same
+    relative path, and renamed_ratio of the copies under a different name so
+    only content matching finds them.
+    """
+    rng = random.Random(spec.seed)
+    sample_size = size_sampler(spec.sizes, rng)
+    mnt = os.path.join(root, "mnt")
+    targets = [os.path.join(mnt, f"disk{i + 1}") for i in range(spec.disks)]
+    targets += [os.path.join(mnt, f"pool{i + 1}") for i in range(spec.pools)]
+    for target in targets:
+        os.makedirs(target, exist_ok=True)
+
+    stats = {"files": 0, "bytes": 0, "duplicates": 0, "duplicate_bytes": 0}
+    index = 0
+    for target in targets:
+        for _ in range(spec.files):
+            index += 1
+            rel_path = random_rel_path(rng, spec, index)
+            size = sample_size()
+            header = f"{index}:{rel_path}\n".encode("utf-8")
+            write_file(os.path.join(target, rel_path), size, header)
+            stats["files"] += 1
+            stats["bytes"] += size
+            if len(targets) < 2 or rng.random() >= spec.dup_ratio:
+                continue
+            others = [t for t in targets if t != target]
+            for other in rng.sample(others, min(spec.copies, len(others))):
+                copy_path = rel_path
+                if rng.random() < spec.renamed_ratio:
+                    copy_path = os.path.join(os.path.dirname(rel_path), f"copy_{index}_{os.path.basename(rel_path)}")
+                full_path = os.path.join(other, copy_path)
+                if os.path.exists(full_path):
+                    continue
+                write_file(full_path, size, header)
+                stats["files"] += 1
+                stats["bytes"] += size
+                stats["duplicates"] += 1
+                stats["duplicate_bytes"] += size
+    return stats
+
+def add_spec_arguments(parser):
+    defaults = TreeSpec()
+    parser.add_argument("--disks", type=int, default=defaults.disks, help="array disks (diskN)")
+    parser.add_argument("--pools", type=int, default=defaults.pools, help="pool drives (poolN)")
+    parser.add_argument("--files", type=int, default=defaults.files, help="original files per drive")
+    parser.add_argument("--dup-ratio", type=float, default=defaults.dup_ratio, help="share of files copied to other drives")
+    parser.add_argument("--renamed-ratio", type=float, default=defaults.renamed_ratio, help="share of copies given a new name")
+    parser.add_argument("--copies", type=int, default=defaults.copies, help="extra copies of a duplicated file")
+    parser.add_argument("--depth", type=int, default=defaults.depth, help="maximum directory depth")
+    parser.add_argument("--fanout", type=int, default=defaults.fanout, help="directories per level")
+    parser.add_argument("--sizes", default=defaults.sizes, help="fixed:N, uniform:MIN,MAX or lognormal:MU,SIGMA")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+def spec_from_args(args):
+    return TreeSpec(
+        disks=args.disks, pools=args.pools, files=args.files, dup_ratio=args.dup_ratio,
+        renamed_ratio=args.renamed_ratio, copies=args.copies, depth=args.depth,
+        fanout=args.fanout, sizes=args.sizes, seed=args.seed,
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("root", help="directory to build the tree in")
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+    stats = generate_tree(args.root, spec_from_args(args))
+    print(json.dumps(stats, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+# benchmarks/run.py
+"""Benchmark scans and cleanups against a generated array.
+
+Every scenario runs in a fresh interpreter so its peak RSS is its own. The
+results are written to a JSON file; pass an earlier one with --compare to
+see what got faster or slower.
+
+    python -m benchmarks.run --files 20000 --compare benchmarks/results/old.json
+"""
+import os, sys, json, shutil, argparse, platform, resource, tempfile, threading
+import multiprocessing
+from collections import Counter
+from datetime import datetime
+from time import perf_counter, process_time
+
+from benchmarks.generate import TreeSpec, generate_tree, add_spec_arguments, spec_from_args
+
+SCENARIOS = ("walk", "scan_path", "scan_content", "rescan", "delete", "move")
+# Scenarios that change the tree get one of their own
+DESTRUCTIVE = ("delete", "move")
+# Python-level filesystem calls counted during a scenario. DirEntry.stat()
+# can't be wrapped, /proc/self/io adds the kernel's read/write syscall counts.
+COUNTED_OS_CALLS = ("stat", "lstat", "scandir", "listdir", "remove", "rename", "replace", "rmdir", "makedirs")
+# A scenario this much slower than the baseline is reported as a regression
+REGRESSION_THRESHOLD = 1.10
+
+class OsCallCounter:
+    """Counts calls to the os functions in COUNTED_OS_CALLS while active."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        self.originals = {}
+
+    def _wrap(self, name, func):
+        def counted(*args, **kwargs):
+            with self.lock:
+                self.counts[name] += 1
+            return func(*args, **kwargs)
+        return counted
+
+    def __enter__(self):
+        for name in COUNTED_OS_CALLS:
+            self.originals[name] = getattr(os, name)
+            setattr(os, name, self._wrap(name, self.originals[name]))
+        return self
+
+    def __exit__(self, *exc):
+        for name, func in self.originals.items():
+            setattr(os, name, func)
+
+def read_proc_io():
+    """Read/write syscall counts of this process, empty where /proc isn't available."""
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return {"read_syscalls": int(fields["syscr"]), "write_syscalls": int(fields["syscw"])}
+    except (OSError, KeyError, ValueError):
+        return {}
+
+def phase_channel(name):
+    """A ProgressChannel that records how long each phase lasted."""
+    from modules.progress import ProgressChannel
+
+    class PhaseTimer(ProgressChannel):
+        def __init__(self, job):
+            self.phases = {}
+            self.current = None
+            super().__init__(job)
+
+        def update(self, **fields):
+            phase = fields.get("phase")
+            if phase is not None and phase != self.current:
+                now = perf_counter()
+                if self.current is not None:
+                    self.phases[self.current] = self.phases.get(self.current, 0) + now - self.started_at
+                self.current, self.started_at = phase, now
+            super().update(**fields)
+
+        def close(self):
+            """Durations per phase, the last one ending now."""
+            if self.current is not None:
+                self.phases[self.current] = self.phases.get(self.current, 0) + perf_counter() - self.started_at
+                self.current = None
+            return {phase: round(seconds, 4) for phase, seconds in self.phases.items()}
+
+    return PhaseTimer(name)
+
+def make_app(app_root):
+    from flask import Flask
+    os.makedirs(os.path.join(app_root, "static", "output"), exist_ok=True)
+    return Flask("benchmark", root_path=app_root)
+
+def scan_tree(app, disks, events=None, **kwargs):
+    from modules.scan import scan_for_duplicates
+    kwargs.setdefault("incremental", False)
+    return scan_for_duplicates(disks, 0, [], ["newest", "largest"], app, events=events, **kwargs)
+
+def tree_drives(root):
+    from modules.scan import get_array_drives, get_pool_drives
+    mnt = os.path.join(root, "mnt")
+    return get_array_drives(mnt) + get_pool_drives(mnt)
+
+def run_scenario(name, tree_root, app_root):
+    """Run one scenario in this process and return its measurements."""
+    app = make_app(app_root)
+    disks = tree_drives(tree_root)
+    events = phase_channel(name)
+    result = {}
+
+    # Work that is set up here is not part of the measurement
+    if name == "rescan":
+        scan_tree(app, disks, incremental=True)
+    elif name in DESTRUCTIVE:
+        summary = scan_tree(app, disks)
+        csv_name = os.path.basename(summary["csv_file"]) if summary and summary.get("csv_file") else None
+        if csv_name is None:
+            return {"error": "The generated tree has no duplicates."}
+
+    def work():
+        if name == "walk":
+            from modules.scan import walk_files
+            files = total_bytes = 0
+            for disk in disks:
+                for _, _, st in walk_files(disk):
+                    files += 1
+                    total_bytes += st.st_size
+            return {"files": files, "bytes": total_bytes}
+        if name in ("scan_path", "scan_content", "rescan"):
+            match_mode = "content" if name == "scan_content" else "path"
+            summary = scan_tree(app, disks, events=events, match_mode=match_mode, incremental=name == "rescan")
+            return {"duplicates": summary.get("total_duplicates") if summary else None}
+        from modules.cleanup import delete_duplicates_logic, move_duplicates_logic
+        with app.app_context():
+            if name == "delete":
+                summary, status = delete_duplicates_logic(csv_name, events=events)
+            else:
+                destination = os.path.join(tree_root, "moved")
+                summary, status = move_duplicates_logic(csv_name, destination, events=events)
+        affected = summary.get("total_deleted") if name == "delete" else summary.get("total_moved")
+        return {"status": status, "files": summary.get("total_attempted"), "affected": affected,
+                "failed": summary.get("total_failed"), "error": summary.get("error")}
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    io_before = read_proc_io()
+    cpu_start = process_time()
+    start = perf_counter()
+    with OsCallCounter() as counter:
+        result.update(work())
+    wall_time = perf_counter() - start
+    io_after = read_proc_io()
+
+    result["wall_time"] = round(wall_time, 4)
+    result["cpu_time"] = round(process_time() - cpu_start, 4)
+    result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result["start_rss_kb"] = rss_before
+    result["os_calls"] = dict(counter.counts)
+    result.update({key: io_after[key] - io_before.get(key, 0) for key in io_after})
+    result["phases"] = events.close()
+    files = result.get("files")
+    if not isinstance(files, int):
+        # Scans report their file count through the progress channel
+        files = events.snapshot()[1].get("files_done")
+        result["files"] = files
+    if files and wall_time:
+        result["files_per_sec"] = round(files / wall_time, 1)
+    return result
+
+def _scenario_process(name, tree_root, app_root, queue):
+    try:
+        queue.put(run_scenario(name, tree_root, app_root))
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+def run_isolated(name, tree_root, app_root):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_scenario_process, args=(name, tree_root, app_root, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+def compare(results, baseline):
+    """Print wall time and files/sec against a baseline run, flagging regressions."""
+    print(f"\n{'scenario':<14}{'wall (s)':>12}{'baseline':>12}{'ratio':>8}{'files/s':>12}")
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous or "wall_time" not in current or "wall_time" not in previous:
+            continue
+        ratio = current["wall_time"] / previous["wall_time"] if previous["wall_time"] else 0
+        flag = "  slower" if ratio > REGRESSION_THRESHOLD else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<14}{current['wall_time']:>12.3f}{previous['wall_time']:>12.3f}{ratio:>8.2f}"
+              f"{current.get('files_per_sec', 0):>12,.0f}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated, from: " + ", ".join(SCENARIOS))
+    parser.add_argument("--root", help="work directory, a temporary one under /tmp by default")
+    parser.add_argument("--keep", action="store_true", help="keep the generated trees")
+    parser.add_argument("--output", help="results file, benchmarks/results/<version>_<time>.json by default")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+
+    from config import APP_VERSION
+    spec = spec_from_args(args)
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    # Moves only accept destinations under /mnt or /tmp
+    root = args.root or tempfile.mkdtemp(prefix="udfh_bench_", dir="/tmp")
+    results = {
+        "version": APP_VERSION,
+        "timestamp": datetime.now().strftime("%Y-%m-%d_%H-%M-%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "spec": spec.as_dict(),
+        "scenarios": {},
+    }
+    try:
+        shared_root = os.path.join(root, "shared")
+        for name in scenarios:
+            tree_root = os.path.join(root, name) if name in DESTRUCTIVE else shared_root
+            if not os.path.isdir(os.path.join(tree_root, "mnt")):
+                print(f"Generating tree in {tree_root}...")
+                results.setdefault("tree", generate_tree(tree_root, spec))
+            print(f"Running {name}...")
+            result = run_isolated(name, tree_root, os.path.join(root, "app", name))
+            results["scenarios"][name] = result
+            print(f"  {json.dumps(result)}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "results", f"{APP_VERSION}_{results['timestamp']}.json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to: {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f))
+        if regressions:
+            print(f"Slower than the baseline: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
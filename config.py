@@ -6,3 +6,40 @@ APP_VERSION = "1.0.3"
 
 # Secret key for CSRF protection
 SECRET_KEY = os.getenv("SECRET_KEY", "default_development_secret_key")
+
+# Maximum number of disks walked at the same time during a scan
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", "4"))
+
+# Maximum number of files kept in the content hash cache
+HASH_CACHE_MAX_ENTRIES = int(os.getenv("HASH_CACHE_MAX_ENTRIES", "5000000"))
+
+# Memory ceiling (MB) for the scan index; 0 keeps the whole index in memory
+SCAN_MEMORY_LIMIT_MB = int(os.getenv("SCAN_MEMORY_LIMIT_MB", "0"))
+
+# Maximum number of disks cleaned up at the same time
+CLEANUP_WORKERS = int(os.getenv("CLEANUP_WORKERS", "4"))
+
+# Progress is published every PROGRESS_BATCH_FILES files or PROGRESS_INTERVAL_MS milliseconds, whichever comes first
+PROGRESS_BATCH_FILES = int(os.getenv("PROGRESS_BATCH_FILES", "1000"))
+PROGRESS_INTERVAL_MS = int(os.getenv("PROGRESS_INTERVAL_MS", "250"))
+
+# Console progress bar: "auto" shows it only when attached to a terminal, "1" or "0" force it on or off
+CONSOLE_PROGRESS = os.getenv("CONSOLE_PROGRESS", "auto").lower()
+
+# Scans and cleanups that may run at the same time, later jobs wait in a queue
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+
+# Finished jobs kept for status lookups before the oldest are dropped
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "50"))
+
+# Seconds between scan checkpoints used to resume an interrupted scan; 0 turns checkpoints off
+SCAN_CHECKPOINT_SECONDS = int(os.getenv("SCAN_CHECKPOINT_SECONDS", "300"))
+
+# Profile every scan and cleanup ("1"), otherwise only jobs started with the profile option
+PROFILE_JOBS = os.getenv("PROFILE_JOBS", "0") == "1"
+
+# "cprofile" saves a .pstats file, "sample" a collapsed-stack file for flame graphs
+PROFILE_MODE = os.getenv("PROFILE_MODE", "cprofile").lower()
+
+# Milliseconds between stack samples in the "sample" profile mode
+PROFILE_SAMPLE_MS = int(os.getenv("PROFILE_SAMPLE_MS", "10"))
@@ -0,0 +1,151 @@
+# modules/catalog.py
+import os, json, glob
+from threading import Lock
+
+CATALOG_NAME = "catalog.json"
+# Bump when entries change shape so old catalogs are rebuilt
+CATALOG_VERSION = 2
+
+# Fields of a cleanup report shown in the history list
+CLEANUP_HISTORY_FIELDS = (
+    "timestamp", "action", "original_csv", "total_attempted",
+    "total_deleted", "total_moved", "total_linked", "total_failed",
+)
+
+class Catalog:
+    """Index of the summaries in one output directory.
+
+    Listing pages read one small file instead of parsing every report, and
+    the file's revision doubles as the ETag. Writers add an entry when they
+    save a report and remove it when they prune one. A missing or outdated
+    catalog is rebuilt from the reports once.
+    """
+
+    def __init__(self, directory, pattern, entry_for):
+        self.directory = directory
+        self.path = os.path.join(directory, CATALOG_NAME)
+        self.pattern = pattern
+        self.entry_for = entry_for
+        self.lock = Lock()
+        self.entries_by_name = None
+        self.revision = 0
+        self.loaded_stat = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        """Make the in-memory copy current. Called with the lock held."""
+        current = self._stat()
+        if current is not None and current == self.loaded_stat:
+            return
+        if current is not None:
+            try:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+                if data.get("version") == CATALOG_VERSION:
+                    self.entries_by_name = data["entries"]
+                    self.revision = data.get("revision", 0)
+                    self.loaded_stat = current
+                    return
+            except Exception as e:
+                print(f"Error reading catalog {self.path}, rebuilding it: {e}")
+        self._rebuild()
+
+    def _rebuild(self):
+        entries = {}
+        for path in glob.glob(os.path.join(self.directory, self.pattern)):
+            try:
+                with open(path, "r") as f:
+                    entry = self.entry_for(os.path.basename(path), json.load(f))
+                if entry is not None:
+                    entries[os.path.basename(path)] = entry
+            except Exception as e:
+                print(f"Error reading {path} for the catalog: {e}")
+        self.entries_by_name = entries
+        self._save()
+
+    def _save(self):
+        self.revision += 1
+        tmp_path = self.path + ".tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, "w") as f:
+                json.dump(
+                    {"version": CATALOG_VERSION, "revision": self.revision, "entries": self.entries_by_name},
+                    f, separators=(",", ":"),
+                )
+            os.replace(tmp_path, self.path)
+            self.loaded_stat = self._stat()
+        except Exception as e:
+            print(f"Error writing catalog {self.path}: {e}")
+            self.loaded_stat = None
+
+    def add(self, name, data):
+        """Index the report saved as name, data being its full contents."""
+        entry = self.entry_for(name, data)
+        with self.lock:
+            self._load()
+            if entry is None:
+                if self.entries_by_name.pop(name, None) is None:
+                    return
+            else:
+                self.entries_by_name[name] = entry
+            self._save()
+
+    def remove(self, names):
+        with self.lock:
+            self._load()
+            removed = [name for name in names if self.entries_by_name.pop(name, None) is not None]
+            if removed:
+                self._save()
+
+    def entries(self):
+        """(ETag, entries newest first)."""
+        with self.lock:
+            self._load()
+            names = sorted(self.entries_by_name, reverse=True)
+            return self._etag(), [self.entries_by_name[name] for name in names]
+
+    def etag(self):
+        """Revision of the catalog, changes whenever an entry does."""
+        with self.lock:
+            self._load()
+            return self._etag()
+
+    def _etag(self):
+        mtime_ns = self.loaded_stat[0] if self.loaded_stat else 0
+        return f"{self.revision:x}-{mtime_ns:x}"
+
+def _scan_entry(name, summary):
+    # Only scans that found duplicates have a CSV to clean up
+    if summary.get("csv_file") and summary.get("total_duplicates") and summary.get("total_duplicates") != "0":
+        return summary
+    return None
+
+def _cleanup_entry(name, summary):
+    entry = {field: summary.get(field) for field in CLEANUP_HISTORY_FIELDS}
+    entry["filename"] = name
+    return entry
+
+catalogs = {}
+catalogs_lock = Lock()
+
+def _catalog(directory, pattern, entry_for):
+    path = os.path.abspath(directory)
+    with catalogs_lock:
+        if path not in catalogs:
+            catalogs[path] = Catalog(path, pattern, entry_for)
+        return catalogs[path]
+
+def scan_catalog(directory):
+    """Catalog of the duplicates_*.json scan summaries in directory."""
+    return _catalog(directory, "duplicates_*.json", _scan_entry)
+
+def cleanup_catalog(directory):
+    """Catalog of the cleanup_*.json reports in directory."""
+    return _catalog(directory, "cleanup_*.json", _cleanup_entry)
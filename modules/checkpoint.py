@@ -0,0 +1,81 @@
+# modules/checkpoint.py
+import os, json, gzip, shutil, hashlib
+from pathlib import Path
+from time import time
+
+# Bump when the checkpoint layout changes so old checkpoints are ignored
+CHECKPOINT_VERSION = 1
+
+class ScanCheckpoint:
+    """Saved progress of an unfinished scan, used to resume it.
+
+    A checkpoint belongs to one set of scan parameters (disks, filters,
+    minimum size, match mode) and lives in its own directory. Every disk
+    walker writes its own file with the directories it has finished, in the
+    snapshot layout [mtime_ns, subdirs, files], so walkers never wait on each
+    other. Walking a disk again with those directories as its snapshot
+    rebuilds the partial index without listing or stat'ing anything that
+    hasn't changed, and only the unfinished part of the tree is read.
+    """
+
+    def __init__(self, root, params, interval):
+        self.root = root
+        self.params = params
+        self.interval = interval
+        key = hashlib.sha1(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(root, key)
+
+    def _disk_path(self, disk):
+        return os.path.join(self.path, disk.strip("/").replace("/", "_") + ".json.gz")
+
+    def load_disk(self, disk):
+        """Return (finished directories, complete) for disk, or (None, False)."""
+        path = self._disk_path(disk)
+        try:
+            with gzip.open(path, "rt") as f:
+                data = json.load(f)
+            if data.get("version") != CHECKPOINT_VERSION or data.get("disk") != disk:
+                return None, False
+            return data["dirs"], bool(data.get("complete"))
+        except FileNotFoundError:
+            return None, False
+        except Exception as e:
+            print(f"Error reading checkpoint {path}: {e}")
+            return None, False
+
+    def save_disk(self, disk, dirs, complete=False):
+        """Write the directories finished on disk. Only the disk's own walker calls this."""
+        path = self._disk_path(disk)
+        tmp_path = path + ".tmp"
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            params_file = os.path.join(self.path, "params.json")
+            if not os.path.exists(params_file):
+                with open(params_file, "w") as f:
+                    json.dump(self.params, f, indent=2)
+            with gzip.open(tmp_path, "wt", compresslevel=1) as f:
+                json.dump(
+                    {"version": CHECKPOINT_VERSION, "disk": disk, "complete": complete,
+                     "saved": time(), "dirs": dirs},
+                    f, separators=(",", ":"),
+                )
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Error writing checkpoint {path}: {e}")
+
+    def exists(self):
+        return os.path.isdir(self.path)
+
+    def clear(self):
+        """Drop the checkpoint once the scan has run to the end."""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+def clean_old_checkpoints(root, keep_count=5):
+    checkpoints = sorted(
+        (p for p in Path(root).glob("*") if p.is_dir()),
+        key=lambda p: p.stat().st_mtime,
+        reverse=True,
+    )
+    for old_checkpoint in checkpoints[keep_count:]:
+        shutil.rmtree(old_checkpoint, ignore_errors=True)
+        print(f"Deleted old checkpoint: {old_checkpoint}")
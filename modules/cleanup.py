@@ -1,29 +1,249 @@
-import os, csv, json, shutil, sys, re
+import os, csv, json, shutil, sys, errno, uuid
 from datetime import datetime
 from flask import current_app
-from multiprocessing import Value, Array
+from threading import Event, Lock
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from time import perf_counter
+from config import CLEANUP_WORKERS
+from modules.progress import ProgressChannel, ProgressReporter
+from modules.result_store import ResultStore
+from modules.catalog import cleanup_catalog
+from modules.metrics import RunMetrics, registry
+from modules.profiling import worker_initializer
+
+try:
+    import fcntl
+except ImportError:  # Not available outside Linux/Unix
+    fcntl = None
+
+# ioctl request to clone a whole file (linux/fs.h)
+FICLONE = 0x40049409
+# Chunk size for kernel-side copies between filesystems
+MOVE_CHUNK_SIZE = 64 * 1024 * 1024
+# Moves to the same destination path share one of these locks so they never race
+MOVE_LOCK_STRIPES = 256
+# Ways the link action can replace a duplicate with its kept copy
+LINK_METHODS = ("hardlink", "reflink")
+
+def try_reflink(src, dst):
+    """Clone src into dst without copying data (btrfs/xfs). Returns False if unsupported."""
+    if fcntl is None:
+        return False
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return True
+    except OSError:
+        try:
+            os.remove(dst)
+        except OSError:
+            pass
+        return False
 
-# Global progress variable for cleanup actions
-CLEANUP_PROGRESS = Value("i", 0)
-CURRENT_FILE_PROGRESS = Value("i", 0)
-CURRENT_FILE_NAME = Array("c", 256)  # Fixed-length char buffer
+def copy_with_progress(src, dst, chunk_size=MOVE_CHUNK_SIZE, progress=None):
+    """Copy src to dst and its metadata, keeping the data in the kernel where possible.
 
-def copy_with_progress(src, dst, chunk_size=1024*1024):
+    progress(copied, total) is called after every chunk.
+    """
     total_size = os.path.getsize(src)
     copied = 0
-    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
-        while True:
-            chunk = fsrc.read(chunk_size)
-            if not chunk:
-                break
-            fdst.write(chunk)
-            copied += len(chunk)
-            with CURRENT_FILE_PROGRESS.get_lock():
-                CURRENT_FILE_PROGRESS.value = int(copied / total_size * 100)
-    shutil.copystat(src, dst)
-    os.remove(src)
-    with CURRENT_FILE_PROGRESS.get_lock():
-        CURRENT_FILE_PROGRESS.value = 0
+    use_copy_file_range = hasattr(os, "copy_file_range")
+    use_sendfile = hasattr(os, "sendfile")
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            in_fd, out_fd = fsrc.fileno(), fdst.fileno()
+            while True:
+                sent = None
+                if use_copy_file_range:
+                    try:
+                        sent = os.copy_file_range(in_fd, out_fd, chunk_size)
+                    except OSError as e:
+                        if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF):
+                            raise
+                        use_copy_file_range = False
+                if sent is None and use_sendfile:
+                    try:
+                        sent = os.sendfile(out_fd, in_fd, None, chunk_size)
+                    except OSError as e:
+                        if e.errno not in (errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                            raise
+                        use_sendfile = False
+                if sent is None:
+                    # Plain user-space copy, large buffers to keep the syscall count down
+                    chunk = fsrc.read(chunk_size)
+                    sent = len(chunk)
+                    if sent:
+                        fdst.write(chunk)
+                if not sent:
+                    break
+                copied += sent
+                if progress:
+                    progress(copied, total_size)
+        shutil.copystat(src, dst)
+    except BaseException:
+        # Don't leave a partial copy behind
+        try:
+            os.remove(dst)
+        except OSError:
+            pass
+        raise
+
+def move_file(src, dst, progress=None, copy_lock=None):
+    """Move src to dst using the cheapest method available.
+
+    Renames on the same filesystem and otherwise copies in the kernel
+    before removing the source, holding copy_lock (if given) for the copy
+    only. Returns the method used.
+    """
+    try:
+        os.rename(src, dst)
+        method = "rename"
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        with copy_lock or nullcontext():
+            copy_with_progress(src, dst, progress=progress)
+        method = "copy"
+        os.remove(src)
+    return method
+
+def link_file(kept, duplicate, method="hardlink", expected_size=None):
+    """Replace duplicate with a hardlink or reflink to kept.
+
+    The link is made under a temporary name next to the duplicate and
+    renamed over it, so the path always holds either the old file or the
+    link. Files on different filesystems are refused. Returns False if both
+    paths already are the same file.
+    """
+    kept_st = os.stat(kept)
+    duplicate_st = os.stat(duplicate)
+    if os.path.samestat(kept_st, duplicate_st):
+        return False
+    if kept_st.st_dev != duplicate_st.st_dev:
+        raise OSError(errno.EXDEV, "The kept copy is on another filesystem")
+    if kept_st.st_size != duplicate_st.st_size or expected_size not in (None, duplicate_st.st_size):
+        raise ValueError("File changed since the scan")
+    tmp_path = os.path.join(os.path.dirname(duplicate), f".{os.path.basename(duplicate)}.{uuid.uuid4().hex[:8]}.link")
+    try:
+        if method == "reflink":
+            if not try_reflink(kept, tmp_path):
+                raise OSError(errno.EOPNOTSUPP, "The filesystem does not support reflinks")
+            # A clone is a file of its own, so it keeps the duplicate's metadata
+            shutil.copystat(duplicate, tmp_path)
+            try:
+                os.chown(tmp_path, duplicate_st.st_uid, duplicate_st.st_gid)
+            except OSError:
+                pass
+        else:
+            os.link(kept, tmp_path)
+        os.replace(tmp_path, duplicate)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return True
+
+def disk_of(path, rel_path=""):
+    """The disk root a scanned path lives on, used to give each disk its own queue.
+
+    The root is the full path without its relative path. Without a
+    relative path, /mnt/<disk> is assumed.
+    """
+    if rel_path and path.endswith(os.sep + rel_path):
+        return path[:-len(rel_path) - 1]
+    parts = path.split(os.sep)
+    return os.sep.join(parts[:3]) if len(parts) > 3 else os.path.dirname(path)
+
+def run_streams(streams, worker, max_workers=None):
+    """Call worker(item) for every item of every stream.
+
+    A stream, usually the files of one disk, runs one item after another on
+    the same thread, different streams run in parallel, up to max_workers
+    (CLEANUP_WORKERS by default).
+    """
+    if not streams:
+        return
+
+    def drain(stream):
+        for item in stream:
+            worker(item)
+
+    workers = max(1, min(max_workers or CLEANUP_WORKERS, len(streams)))
+    with ThreadPoolExecutor(max_workers=workers, initializer=worker_initializer()) as executor:
+        for future in [executor.submit(drain, stream) for stream in streams]:
+            future.result()
+
+class CleanupPlan:
+    """The files a scan marked Keep = no, split per disk.
+
+    Scans with a result store stream each disk's files straight from it, so
+    nothing is held in memory. Older scans only have the CSV, which is read
+    once into per-disk lists of (path, size). With with_kept, items are
+    (path, size, kept path, verified) for the link action. Streams put the
+    disk root in front of every item.
+    """
+
+    def __init__(self, csv_path, with_kept=False):
+        self.store = ResultStore.for_csv(csv_path)
+        self.with_kept = with_kept
+        self.lists = None
+        if self.store is not None:
+            self.disks = self.store.cleanup_disks()
+        else:
+            self.disks, self.lists = self._read_csv(csv_path, with_kept)
+        self.count = sum(count for count, _ in self.disks.values())
+        self.size = sum(size for _, size in self.disks.values())
+
+    @staticmethod
+    def _read_csv(csv_path, with_kept=False):
+        disks = {}
+        lists = {}
+        kept = {}
+        with open(csv_path, newline="") as f:
+            for row in csv.DictReader(f):
+                file_path = row.get("Full Path", "").strip()
+                if not file_path:
+                    continue
+                if row.get("Keep", "").strip().lower() == "yes":
+                    kept[row.get("Group")] = file_path
+                    continue
+                try:
+                    size = int(float(row.get("Size") or 0))
+                except ValueError:
+                    size = 0
+                disk = disk_of(file_path, row.get("Relative Path", "").strip())
+                if with_kept:
+                    # The kept path is filled in once the whole group has been read
+                    verified = row.get("Verified", "").strip().lower() == "verified"
+                    lists.setdefault(disk, []).append((file_path, size, row.get("Group"), verified))
+                else:
+                    lists.setdefault(disk, []).append((file_path, size))
+                count, total = disks.get(disk, (0, 0))
+                disks[disk] = (count + 1, total + size)
+        if with_kept:
+            lists = {
+                disk: [(path, size, kept.get(group), verified) for path, size, group, verified in items]
+                for disk, items in lists.items()
+            }
+        return disks, lists
+
+    def files(self, disk):
+        """Iterate (path, size), or (path, size, kept path, verified) with with_kept, for the files on disk."""
+        if self.lists is not None:
+            return iter(self.lists[disk])
+        if self.with_kept:
+            return self.store.link_files(disk)
+        return self.store.cleanup_files(disk)
+
+    def _disk_stream(self, disk):
+        for item in self.files(disk):
+            yield (disk,) + tuple(item)
+
+    def streams(self):
+        return [self._disk_stream(disk) for disk in self.disks]
 
 def clean_old_cleanup_files(directory, keep_count=10):
     # Clean CSV files
@@ -45,80 +265,131 @@ def clean_old_cleanup_files(directory, keep_count=10):
         key=lambda f: f.stat().st_mtime,
         reverse=True
     )
+    removed = []
     for old_file in json_files[keep_count:]:
         try:
             os.remove(old_file.path)
+            removed.append(old_file.name)
             print(f"Deleted old cleanup JSON file: {old_file.path}")
         except Exception as e:
             print(f"Error deleting cleanup JSON file {old_file.path}: {e}")
-
-def write_cleanup_results(action, original_csv, affected, failed, attempted, operation_type):
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    base_name = os.path.splitext(os.path.basename(original_csv))[0]
-    output_dir = os.path.join(current_app.root_path, "static", "output", "cleanup_results")
-    os.makedirs(output_dir, exist_ok=True)
-    csv_filename = f"cleanup_{base_name}_{operation_type}_{timestamp}.csv"
-    json_filename = f"cleanup_{base_name}_{operation_type}_{timestamp}.json"
-    csv_path = os.path.join(output_dir, csv_filename)
-    json_path = os.path.join(output_dir, json_filename)
-
-    # Write CSV
-    with open(csv_path, "w", newline="") as f:
-        writer = csv.writer(f)
+    if removed:
+        cleanup_catalog(directory).remove(removed)
+
+class CleanupResultWriter:
+    """Streams the per-file results of a cleanup to its CSV and JSON reports.
+
+    Rows are written as each operation finishes, so nothing has to be matched
+    up afterwards. The attempted list, which holds every file, is spooled to
+    disk and copied into the JSON report when the run is finished; the
+    summary returned to the caller is built from the counts kept in memory.
+    """
+
+    def __init__(self, action, original_csv, operation_type):
+        self.action = action
+        self.original_csv = original_csv
+        self.operation_type = operation_type
+        self.timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        base_name = os.path.splitext(os.path.basename(original_csv))[0]
+        self.output_dir = os.path.join(current_app.root_path, "static", "output", "cleanup_results")
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.csv_filename = f"cleanup_{base_name}_{operation_type}_{self.timestamp}.csv"
+        self.json_filename = f"cleanup_{base_name}_{operation_type}_{self.timestamp}.json"
+        self.csv_path = os.path.join(self.output_dir, self.csv_filename)
+        self.json_path = os.path.join(self.output_dir, self.json_filename)
+        self.spool_path = self.json_path + ".attempted"
+
+        self.lock = Lock()
+        self.total_attempted = 0
+        self.affected = []
+        self.failed = []
+
+        self.csv_file = open(self.csv_path, "w", newline="")
+        self.writer = csv.writer(self.csv_file)
         if operation_type == "delete":
-            writer.writerow(["File Path", "Status", "Error"])
-            for file_path in attempted:
-                if file_path in affected:
-                    writer.writerow([file_path, "Deleted", ""])
-                else:
-                    error_msg = ""
-                    for fail in failed:
-                        if fail.startswith(file_path):
-                            error_msg = fail[len(file_path):].lstrip(": ")
-                            break
-                    writer.writerow([file_path, "Failed", error_msg])
+            self.writer.writerow(["File Path", "Status", "Error"])
         elif operation_type == "move":
-            writer.writerow(["From", "To", "Status", "Error"])
-            for move_info in attempted:
-                found = False
-                for moved_info in affected:
-                    if move_info == moved_info:
-                        writer.writerow([move_info["from"], move_info["to"], "Moved", ""])
-                        found = True
-                        break
-                if not found:
-                    error_msg = ""
-                    for fail in failed:
-                        if fail.startswith(move_info["from"]):
-                            error_msg = fail[len(move_info["from"]):].lstrip(": ")
-                            break
-                    writer.writerow([move_info["from"], move_info["to"], "Failed", error_msg])
+            self.writer.writerow(["From", "To", "Status", "Error"])
+        elif operation_type == "link":
+            self.writer.writerow(["File Path", "Linked To", "Status", "Error"])
         else:
-            writer.writerow(["File Path"])  # Always write header
-
-    # Write JSON summary
-    summary = {
-        "action": action,
-        "timestamp": timestamp,
-        "original_csv": original_csv,
-        "csv_file": csv_filename,
-        "total_attempted": len(attempted),
-        "total_deleted": len(affected) if operation_type == "delete" else None,
-        "total_moved": len(affected) if operation_type == "move" else None,
-        "total_failed": len(failed),
-        "attempted": attempted,
-        "affected": affected,
-        "failed": failed,
-    }
-    with open(json_path, "w") as jf:
-        json.dump(summary, jf, indent=2)
-
-    # Clean up old cleanup files (keep only the latest 10)
-    clean_old_cleanup_files(output_dir, keep_count=10)
-
-    return csv_filename, json_filename
-
-def delete_duplicates_logic(csv_file):
+            self.writer.writerow(["File Path"])  # Always write header
+        self.spool = open(self.spool_path, "w")
+
+    def record(self, item, error=None):
+        """Record one attempted operation. item is a path, or a {"from", "to"} dict for moves and links."""
+        source = item["from"] if isinstance(item, dict) else item
+        with self.lock:
+            if self.total_attempted:
+                self.spool.write(",")
+            self.spool.write(json.dumps(item))
+            self.total_attempted += 1
+            if error is None:
+                self.affected.append(item)
+                status = {"move": "Moved", "link": "Linked"}.get(self.operation_type, "Deleted")
+            else:
+                self.failed.append(f"{source}: {error}")
+                status = "Failed"
+            if isinstance(item, dict):
+                self.writer.writerow([item["from"], item["to"], status, error or ""])
+            else:
+                self.writer.writerow([item, status, error or ""])
+
+    def add_failure(self, message):
+        """Record a failure for a file that was never attempted."""
+        with self.lock:
+            self.failed.append(message)
+
+    def finish(self, message, metrics=None):
+        """Close the CSV, write the JSON report and return the summary."""
+        self.csv_file.close()
+        self.spool.close()
+        summary = {
+            "action": self.action,
+            "timestamp": self.timestamp,
+            "original_csv": self.original_csv,
+            "csv_file": self.csv_filename,
+            "total_attempted": self.total_attempted,
+            "total_deleted": len(self.affected) if self.operation_type == "delete" else None,
+            "total_moved": len(self.affected) if self.operation_type == "move" else None,
+            "total_linked": len(self.affected) if self.operation_type == "link" else None,
+            "total_failed": len(self.failed),
+        }
+        if metrics is not None:
+            summary["metrics"] = metrics.as_dict()
+        with open(self.json_path, "w") as jf:
+            jf.write(json.dumps(summary)[:-1])
+            jf.write(', "attempted": [')
+            with open(self.spool_path, "r") as spool:
+                shutil.copyfileobj(spool, jf)
+            jf.write('], "affected": ')
+            json.dump(self.affected, jf)
+            jf.write(', "failed": ')
+            json.dump(self.failed, jf)
+            jf.write("}")
+        os.remove(self.spool_path)
+        cleanup_catalog(self.output_dir).add(self.json_filename, summary)
+
+        # Clean up old cleanup files (keep only the latest 10)
+        clean_old_cleanup_files(self.output_dir, keep_count=10)
+
+        summary["affected"] = self.affected
+        summary["failed"] = self.failed
+        summary["message"] = message
+        return summary
+
+    def abort(self):
+        """Close the reports without writing the JSON summary."""
+        self.csv_file.close()
+        self.spool.close()
+        try:
+            os.remove(self.spool_path)
+        except OSError:
+            pass
+
+def delete_duplicates_logic(csv_file, events=None, cancel_event=None):
+    events = events or ProgressChannel("delete")
+    cancel_event = cancel_event or Event()
     if "/" in csv_file or "\\" in csv_file or not csv_file.endswith(".csv"):
         return {"error": "Invalid file name."}, 400
 
@@ -128,73 +399,60 @@ def delete_duplicates_logic(csv_file):
     if not os.path.isfile(csv_path):
         return {"error": "CSV file not found."}, 404
 
-    scan_root = "/mnt/disk6/storage/"
-
-    deleted = []
-    failed = []
-    attempted = []
     source_dirs = set()
 
-    # Read all rows first to get total for progress
-    with open(csv_path, newline="") as f:
-        reader_list = list(csv.DictReader(f))
-
-    file_size_map = {}
-    total_size = 0
-    for row in reader_list:
-        keep = row.get("Keep", "").strip().lower()
-        file_path = row.get("Full Path", "").strip()
-        if keep != "yes" and file_path:
-            with CURRENT_FILE_NAME.get_lock():
-                CURRENT_FILE_NAME.value = file_path.encode("utf-8")[:255]
-            attempted.append(file_path)
-            try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    deleted.append(file_path)
-                    source_dirs.add(os.path.dirname(file_path))
-                else:
-                    failed.append(f"File not found: {file_path}")
-            except Exception as e:
-                failed.append(f"{file_path}: {e}")
+    # Sizes come from the scan, files are streamed per disk from its result store
+    plan = CleanupPlan(csv_path)
+    total_size = plan.size
+    total_count = plan.count
+    results_lock = Lock()
+    results = CleanupResultWriter("delete", csv_file, "delete")
+    metrics = RunMetrics()
+
+    def delete_percent(files, nbytes):
+        # --- Phase 1: File processing (0-85%), weighted by size ---
+        if total_size:
+            return min(int(nbytes / total_size * 85), 85)
+        return min(int(files / total_count * 85), 85) if total_count else 85
+
+    reporter = ProgressReporter(channel=events, percent=delete_percent)
+
+    def delete_one(item):
+        if cancel_event.is_set():
+            return
+        disk, file_path, size = item
+        error = None
+        start = perf_counter()
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            error = "File not found"
+        except Exception as e:
+            error = str(e)
+        metrics.add_disk(disk, files=1, nbytes=size, seconds=perf_counter() - start,
+                         errors=0 if error is None else 1)
+        results.record(file_path, error)
+        if error is None:
+            with results_lock:
+                source_dirs.add((disk, os.path.dirname(file_path)))
+        reporter.add(size, file_path)
+
     try:
-        # --- Phase 1: File processing (0-85%) ---
-        processed_size = 0
-        for row in reader_list:
-            keep = row.get("Keep", "").strip().lower()
-            file_path = row.get("Full Path", "").strip()
-            if keep != "yes" and file_path:
-                attempted.append(file_path)
-                try:
-                    if os.path.exists(file_path):
-                        # Simulate per-file progress
-                        with CURRENT_FILE_PROGRESS.get_lock():
-                            CURRENT_FILE_PROGRESS.value = 100
-                        os.remove(file_path)
-                        deleted.append(file_path)
-                        source_dirs.add(os.path.dirname(file_path))
-
-                        with CURRENT_FILE_PROGRESS.get_lock():
-                            CURRENT_FILE_PROGRESS.value = 0
-                    else:
-                        failed.append(f"File not found: {file_path}")
-                except Exception as e:
-                    failed.append(f"{file_path}: {e}")
-                processed_size += file_size_map.get(file_path, 0)
-                with CLEANUP_PROGRESS.get_lock():
-                    progress = int(processed_size / total_size * 85) if total_size else 85
-                    CLEANUP_PROGRESS.value = min(progress, 85)
+        events.update(phase="deleting")
+        # One queue per disk so every spindle is busy at the same time
+        with metrics.phase("deleting"):
+            run_streams(plan.streams(), delete_one)
+        reporter.close()
 
         # --- Phase 2: Directory cleanup (85-95%) ---
+        events.update(phase="removing empty folders", current_file="", file_percent=0)
+        dirs_start = perf_counter()
         all_dirs = set()
-        for d in source_dirs:
-            disk_root_match = re.match(r"(/mnt/disk\d+)", d)
-            if disk_root_match:
-                disk_root = disk_root_match.group(1)
-                current = d
-                while current and current.startswith(disk_root) and current != disk_root:
-                    all_dirs.add(current)
-                    current = os.path.dirname(current)
+        for disk_root, d in source_dirs:
+            current = d
+            while current and current.startswith(disk_root) and current != disk_root:
+                all_dirs.add(current)
+                current = os.path.dirname(current)
         all_dirs_sorted = sorted(all_dirs, key=lambda x: -x.count(os.sep))
         dir_total = len(all_dirs_sorted)
         for i, d in enumerate(all_dirs_sorted):
@@ -204,51 +462,27 @@ def delete_duplicates_logic(csv_file):
             except Exception:
                 pass  # Ignore errors (e.g., not empty, permission denied)
             # Update progress (85-95%)
-            with CLEANUP_PROGRESS.get_lock():
-                if dir_total:
-                    progress = 85 + int((i + 1) / dir_total * 10)
-                else:
-                    progress = 95
-                CLEANUP_PROGRESS.value = min(progress, 95)
-
-        # --- Phase 3: Writing results (95-99%) ---
-        with CLEANUP_PROGRESS.get_lock():
-            CLEANUP_PROGRESS.value = 95
-        cleanup_csv, cleanup_json = write_cleanup_results(
-            action="delete",
-            original_csv=csv_file,
-            affected=deleted,
-            failed=failed,
-            attempted=attempted,
-            operation_type="delete"
-        )
-        with CLEANUP_PROGRESS.get_lock():
-            CLEANUP_PROGRESS.value = 99
-
-        # --- Phase 4: Load summary and finish (100%) ---
-        output_dir = os.path.join(current_app.root_path, "static", "output", "cleanup_results")
-        json_path = os.path.join(output_dir, cleanup_json)
-        summary = {}
-        try:
-            with open(json_path, "r") as jf:
-                summary = json.load(jf)
-        except Exception as e:
-            summary = {"error": f"Could not load summary JSON: {e}"}
-        message = f"Deleted {len(deleted)} files."
-        if failed:
-            message += f" {len(failed)} files could not be deleted."
-        summary["message"] = message
-
-        with CLEANUP_PROGRESS.get_lock():
-            CLEANUP_PROGRESS.value = 100
-
+            events.update(percent=min(85 + int((i + 1) / dir_total * 10), 95))
+        metrics.add_time("removing empty folders", perf_counter() - dirs_start)
+
+        # --- Phase 3: Writing results (95-100%) ---
+        events.update(phase="writing results", percent=95)
+        message = f"Deleted {len(results.affected)} files."
+        if results.failed:
+            message += f" {len(results.failed)} files could not be deleted."
+        if cancel_event.is_set():
+            message += " Canceled before every file was processed."
+        with metrics.phase("writing results"):
+            summary = results.finish(message, metrics)
+        registry.record_cleanup(results.action, metrics)
         return summary, 200
     except Exception as e:
-        with CLEANUP_PROGRESS.get_lock():
-            CLEANUP_PROGRESS.value = 100
+        results.abort()
         return {"error": f"Failed to process CSV: {e}"}, 500
 
-def move_duplicates_logic(csv_file, destination):
+def move_duplicates_logic(csv_file, destination, events=None, cancel_event=None):
+    events = events or ProgressChannel("move")
+    cancel_event = cancel_event or Event()
     if "/" in csv_file or "\\" in csv_file or not csv_file.endswith(".csv"):
         return {"error": "Invalid file name."}, 400
 
@@ -271,108 +505,115 @@ def move_duplicates_logic(csv_file, destination):
     if not os.path.isfile(csv_path):
         return {"error": "CSV file not found."}, 404
 
-    moved = []
-    failed = []
-    attempted = []
     source_dirs = set()
+    source_dirs_lock = Lock()
 
-    # Read all rows first to get total for progress
-    with open(csv_path, newline="") as f:
-        reader_list = list(csv.DictReader(f))
-    total = sum(1 for row in reader_list if row.get("Keep", "").strip().lower() != "yes" and row.get("Full Path", "").strip())
+    plan = CleanupPlan(csv_path)
+    total_size = plan.size
 
     # --- Free space check before moving ---
-    file_size_map = {}
-    total_size = 0
-    for row in reader_list:
-        keep = row.get("Keep", "").strip().lower()
-        file_path = row.get("Full Path", "").strip()
-        if keep != "yes" and file_path and os.path.exists(file_path):
-            try:
-                size = os.path.getsize(file_path)
-                file_size_map[file_path] = size
-                total_size += size
-            except Exception:
-                file_size_map[file_path] = 0
+    # Sizes come from the scan, so only each source disk is stat'ed: files on the
+    # destination's filesystem are renamed and need no extra space
+    dest_dev = os.stat(destination).st_dev
+    required_size = 0
+    for disk, (_, disk_size) in plan.disks.items():
+        try:
+            if os.stat(disk).st_dev == dest_dev:
+                continue
+        except OSError:
+            pass
+        required_size += disk_size
     usage = shutil.disk_usage(destination)
-    if total_size > usage.free:
+    if required_size > usage.free:
         return {
             "error": (
                 f"Not enough free space at destination. "
-                f"Required: {total_size/1024/1024:.2f} MB, "
+                f"Required: {required_size/1024/1024:.2f} MB, "
                 f"Available: {usage.free/1024/1024:.2f} MB"
             )
         }, 400
 
+    results = None
     try:
         # --- Phase 1: File processing (085%) with byte-accurate progress ---
-        file_size_map = {}
-        total_size = 0
-
-        # First pass: build file size map
-        for row in reader_list:
-            keep = row.get("Keep", "").strip().lower()
-            file_path = row.get("Full Path", "").strip()
-            if keep != "yes" and file_path and os.path.exists(file_path):
-                try:
-                    size = os.path.getsize(file_path)
-                    file_size_map[file_path] = size
-                    total_size += size
-                except Exception:
-                    file_size_map[file_path] = 0  # Can't stat, assume 0
-
-        processed_size = 0
-
-        # Second pass: move files and update progress
-        for row in reader_list:
-            keep = row.get("Keep", "").strip().lower()
-            file_path = row.get("Full Path", "").strip()
-            if keep != "yes" and file_path:
-                with CURRENT_FILE_NAME.get_lock():
-                    CURRENT_FILE_NAME.value = file_path.encode("utf-8")[:255]
-
-                match = re.search(r"/mnt/disk\d+/(.+)", file_path)
-                if match:
-                    rel_path = match.group(1)
-                    dest_path = os.path.join(destination, rel_path)
-                else:
-                    print(f"Could not determine relative path for {file_path}")
-                    sys.stdout.flush()
-                    failed.append(f"Could not determine relative path for {file_path}")
-                    continue
+        # Sizes were collected by the free space check above
+        results = CleanupResultWriter("move", csv_file, "move")
+        metrics = RunMetrics()
+        reporter = ProgressReporter(
+            channel=events,
+            percent=lambda files, nbytes: min(int(nbytes / total_size * 85), 85) if total_size else 85,
+        )
 
-                attempted.append({"from": file_path, "to": dest_path})
-                try:
+        def file_progress(copied, total):
+            events.update(file_percent=int(copied / total * 100) if total else 100)
+
+        # The same relative path on two disks lands on the same destination
+        dest_locks = [Lock() for _ in range(MOVE_LOCK_STRIPES)]
+        # Streams run per source disk, one lock per destination disk keeps
+        # their copies from writing to the same spindle at once. Renames
+        # only touch metadata and don't take it
+        dest_disk_locks = {}
+        dest_disk_locks_lock = Lock()
+
+        def dest_disk_lock(dest_path):
+            dev = os.stat(os.path.dirname(dest_path)).st_dev
+            with dest_disk_locks_lock:
+                return dest_disk_locks.setdefault(dev, Lock())
+
+        def move_one(item):
+            if cancel_event.is_set():
+                return
+            disk, file_path, size = item
+            rel_path = os.path.relpath(file_path, disk)
+            if rel_path.startswith(os.pardir):
+                print(f"Could not determine relative path for {file_path}")
+                sys.stdout.flush()
+                results.add_failure(f"Could not determine relative path for {file_path}")
+                reporter.add(size, file_path)
+                return
+            dest_path = os.path.join(destination, rel_path)
+            move_info = {"from": file_path, "to": dest_path}
+            # Moves can take minutes, show the file as soon as it starts
+            reporter.start_file(file_path)
+            error = None
+            start = perf_counter()
+            try:
+                with dest_locks[hash(dest_path) % MOVE_LOCK_STRIPES]:
                     if os.path.exists(file_path):
                         os.makedirs(os.path.dirname(dest_path), exist_ok=True)
                         print(f"Moving: {file_path} -> {dest_path}")
                         sys.stdout.flush()
-                        copy_with_progress(file_path, dest_path)
-                        moved.append({"from": file_path, "to": dest_path})
-                except Exception as e:
-                    print(f"Failed to move {file_path} -> {dest_path}: {e}")
-                    sys.stdout.flush()
-                    failed.append(f"{file_path}: {e}")
-
-                # Update progress based on size
-                processed_size += file_size_map.get(file_path, 0)
-                with CLEANUP_PROGRESS.get_lock():
-                    progress = int(processed_size / total_size * 85) if total_size else 85
-                    CLEANUP_PROGRESS.value = min(progress, 85)         
-
-        with CURRENT_FILE_NAME.get_lock():
-            CURRENT_FILE_NAME.value = b""
+                        move_file(file_path, dest_path, progress=file_progress, copy_lock=dest_disk_lock(dest_path))
+                        with source_dirs_lock:
+                            source_dirs.add((disk, os.path.dirname(file_path)))
+                    else:
+                        error = "File not found"
+            except Exception as e:
+                print(f"Failed to move {file_path} -> {dest_path}: {e}")
+                sys.stdout.flush()
+                error = str(e)
+            metrics.add_disk(disk, files=1, nbytes=size, seconds=perf_counter() - start,
+                             errors=0 if error is None else 1)
+            results.record(move_info, error)
+
+            # Update progress based on size
+            reporter.add(size, file_path)
+
+        # One stream per source disk, so every spindle is busy at the same time
+        events.update(phase="moving")
+        with metrics.phase("moving"):
+            run_streams(plan.streams(), move_one)
+        reporter.close()
 
         # --- Phase 2: Directory cleanup (85-95%) ---
+        events.update(phase="removing empty folders", current_file="", file_percent=0)
+        dirs_start = perf_counter()
         all_dirs = set()
-        for d in source_dirs:
-            disk_root_match = re.match(r"(/mnt/disk\d+)", d)
-            if disk_root_match:
-                disk_root = disk_root_match.group(1)
-                current = d
-                while current and current.startswith(disk_root) and current != disk_root:
-                    all_dirs.add(current)
-                    current = os.path.dirname(current)
+        for disk_root, d in source_dirs:
+            current = d
+            while current and current.startswith(disk_root) and current != disk_root:
+                all_dirs.add(current)
+                current = os.path.dirname(current)
         all_dirs_sorted = sorted(all_dirs, key=lambda x: -x.count(os.sep))
         dir_total = len(all_dirs_sorted)
         for i, d in enumerate(all_dirs_sorted):
@@ -382,46 +623,97 @@ def move_duplicates_logic(csv_file, destination):
             except Exception:
                 pass
             # Update progress (85-95%)
-            with CLEANUP_PROGRESS.get_lock():
-                if dir_total:
-                    progress = 85 + int((i + 1) / dir_total * 10)
-                else:
-                    progress = 95
-                CLEANUP_PROGRESS.value = min(progress, 95)
-
-        # --- Phase 3: Writing results (95-99%) ---
-        with CLEANUP_PROGRESS.get_lock():
-            CLEANUP_PROGRESS.value = 95
-        cleanup_csv, cleanup_json = write_cleanup_results(
-            action="move",
-            original_csv=csv_file,
-            affected=moved,
-            failed=failed,
-            attempted=attempted,
-            operation_type="move"
-        )
-        with CLEANUP_PROGRESS.get_lock():
-            CLEANUP_PROGRESS.value = 99
+            events.update(percent=min(85 + int((i + 1) / dir_total * 10), 95))
+        metrics.add_time("removing empty folders", perf_counter() - dirs_start)
+
+        # --- Phase 3: Writing results (95-100%) ---
+        events.update(phase="writing results", percent=95)
+        message = f"Moved {len(results.affected)} files."
+        if results.failed:
+            message += f" {len(results.failed)} files could not be moved."
+        if cancel_event.is_set():
+            message += " Canceled before every file was processed."
+        with metrics.phase("writing results"):
+            summary = results.finish(message, metrics)
+        registry.record_cleanup(results.action, metrics)
+        return summary, 200
+    except Exception as e:
+        if results is not None:
+            results.abort()
+        return {"error": f"Failed to process CSV: {e}"}, 500
 
-        # --- Phase 4: Load summary and finish (100%) ---
-        output_dir = os.path.join(current_app.root_path, "static", "output", "cleanup_results")
-        json_path = os.path.join(output_dir, cleanup_json)
-        summary = {}
-        try:
-            with open(json_path, "r") as jf:
-                summary = json.load(jf)
-        except Exception as e:
-            summary = {"error": f"Could not load summary JSON: {e}"}
-        message = f"Moved {len(moved)} files."
-        if failed:
-            message += f" {len(failed)} files could not be moved."
-        summary["message"] = message
+def link_duplicates_logic(csv_file, method="hardlink", events=None, cancel_event=None):
+    """Replace every verified duplicate with a hardlink or reflink to the kept copy of its group.
+
+    No data is copied and every path stays in place. Only groups whose
+    content was verified are linked, and only within one filesystem.
+    """
+    events = events or ProgressChannel("link")
+    cancel_event = cancel_event or Event()
+    if "/" in csv_file or "\\" in csv_file or not csv_file.endswith(".csv"):
+        return {"error": "Invalid file name."}, 400
+    if method not in LINK_METHODS:
+        return {"error": f"Link method must be one of: {', '.join(LINK_METHODS)}."}, 400
+
+    scan_dir = os.path.join(current_app.root_path, "static", "output", "scan_results")
+    csv_path = os.path.join(scan_dir, csv_file)
 
-        with CLEANUP_PROGRESS.get_lock():
-            CLEANUP_PROGRESS.value = 100
+    if not os.path.isfile(csv_path):
+        return {"error": "CSV file not found."}, 404
 
+    plan = CleanupPlan(csv_path, with_kept=True)
+    total_count = plan.count
+    results = None
+    try:
+        results = CleanupResultWriter("link", csv_file, "link")
+        metrics = RunMetrics()
+        # Links cost the same whatever the file size, so progress counts files
+        reporter = ProgressReporter(
+            channel=events,
+            percent=lambda files, nbytes: min(int(files / total_count * 95), 95) if total_count else 95,
+        )
+
+        def link_one(item):
+            if cancel_event.is_set():
+                return
+            disk, file_path, size, kept_path, verified = item
+            error = None
+            start = perf_counter()
+            try:
+                if not verified:
+                    # Same path is not the same content, only hashed groups are safe to link
+                    error = "Content not verified, rescan with Verify Content or Same Content matching"
+                elif not kept_path:
+                    error = "No kept copy in its group"
+                else:
+                    link_file(kept_path, file_path, method, expected_size=size)
+            except FileNotFoundError:
+                error = "File not found"
+            except Exception as e:
+                error = str(e)
+            metrics.add_disk(disk, files=1, nbytes=size, seconds=perf_counter() - start,
+                             errors=0 if error is None else 1)
+            results.record({"from": file_path, "to": kept_path or ""}, error)
+            reporter.add(size, file_path)
+
+        # --- Phase 1: Linking (0-95%), one stream per disk ---
+        events.update(phase="linking")
+        with metrics.phase("linking"):
+            run_streams(plan.streams(), link_one)
+        reporter.close()
+
+        # --- Phase 2: Writing results (95-100%) ---
+        events.update(phase="writing results", percent=95, current_file="")
+        message = f"Linked {len(results.affected)} files with {method}s."
+        if results.failed:
+            message += f" {len(results.failed)} files could not be linked."
+        if cancel_event.is_set():
+            message += " Canceled before every file was processed."
+        with metrics.phase("writing results"):
+            summary = results.finish(message, metrics)
+        registry.record_cleanup(results.action, metrics)
         return summary, 200
     except Exception as e:
-        with CLEANUP_PROGRESS.get_lock():
-            CLEANUP_PROGRESS.value = 100
+        if results is not None:
+            results.abort()
         return {"error": f"Failed to process CSV: {e}"}, 500
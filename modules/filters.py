@@ -0,0 +1,71 @@
+# modules/filters.py
+import os, re, fnmatch
+
+def _compile_globs(patterns):
+    """Compile glob patterns into one regex, or None when there are none."""
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{fnmatch.translate(p)})" for p in patterns))
+
+def _split_patterns(patterns):
+    """Patterns containing a slash match the relative path, the rest match the name only."""
+    path_patterns = []
+    name_patterns = []
+    for pattern in patterns or []:
+        pattern = pattern.strip().strip("/")
+        if not pattern:
+            continue
+        if "/" in pattern:
+            path_patterns.append(pattern)
+        else:
+            name_patterns.append(pattern)
+    return _compile_globs(name_patterns), _compile_globs(path_patterns)
+
+class PathFilter:
+    """Include/exclude rules compiled once before a walk.
+
+    Excluded directories are pruned before the walker descends into them, and
+    file names are checked before the file is stat'ed.
+    """
+
+    def __init__(self, exclude=None, include=None, extensions=None):
+        self.exclude_name, self.exclude_path = _split_patterns(exclude)
+        self.include_name, self.include_path = _split_patterns(include)
+
+        self.extensions = None
+        self.long_extensions = ()
+        exts = [e.strip().lower() for e in extensions or [] if e.strip()]
+        if exts and "*" not in exts:
+            exts = [e if e.startswith(".") else "." + e for e in exts]
+            # Plain suffixes use a set lookup, multi-part ones like .tar.gz need endswith
+            self.extensions = {e for e in exts if e.count(".") == 1}
+            self.long_extensions = tuple(e for e in exts if e.count(".") > 1)
+
+        self.signature = {
+            "exclude": sorted(p.strip() for p in exclude or [] if p.strip()),
+            "include": sorted(p.strip() for p in include or [] if p.strip()),
+            "extensions": sorted(exts),
+        }
+
+    @property
+    def active(self):
+        return any(self.signature.values())
+
+    def _matches(self, name_re, path_re, name, rel_path):
+        return bool((name_re and name_re.match(name)) or (path_re and path_re.match(rel_path)))
+
+    def excludes_dir(self, name, rel_path):
+        return self._matches(self.exclude_name, self.exclude_path, name, rel_path)
+
+    def accepts_file(self, name, rel_path):
+        if self.extensions is not None:
+            lower = name.lower()
+            if os.path.splitext(lower)[1] not in self.extensions and not (
+                self.long_extensions and lower.endswith(self.long_extensions)
+            ):
+                return False
+        if self._matches(self.exclude_name, self.exclude_path, name, rel_path):
+            return False
+        if self.include_name or self.include_path:
+            return self._matches(self.include_name, self.include_path, name, rel_path)
+        return True
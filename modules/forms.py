@@ -1,5 +1,5 @@
 from flask_wtf import FlaskForm
-from wtforms import SelectField, StringField, SubmitField, HiddenField, SelectMultipleField
+from wtforms import SelectField, StringField, SubmitField, HiddenField, SelectMultipleField, BooleanField
 from wtforms.validators import DataRequired, Optional
 
 class ScanForm(FlaskForm):
@@ -15,9 +15,26 @@ class ScanForm(FlaskForm):
         validators=[DataRequired()],
     )
 
+    match_mode = SelectField(
+        "Match Files By",
+        choices=[
+            ("path", "Same Relative Path"),
+            ("content", "Same Content (any path or name)"),
+        ],
+        default="path",
+        validators=[DataRequired()],
+    )
+
     drives = SelectMultipleField("Drives", choices=[], coerce=str, validators=[DataRequired()])
     min_size = StringField("Minimum File Size (MB)", validators=[Optional()])
     ext_filter = StringField("Extension Filter (e.g. .mkv,.mp4)", validators=[Optional()])
+    exclude_patterns = StringField("Exclude Folders/Files (e.g. appdata,.Recycle.Bin,*.nfo)", validators=[Optional()])
+    include_patterns = StringField("Only Include Paths (e.g. Media/*)", validators=[Optional()])
+    verify_content = BooleanField("Verify Content (size + hash)", default=False)
+    full_rescan = BooleanField("Force Full Rescan", default=False)
+    resume = BooleanField("Resume From Last Checkpoint", default=False)
+    keep_partial = BooleanField("Keep Partial Results If Canceled", default=False)
+    profile = BooleanField("Profile This Scan", default=False)
 
     strategy_choices = [
         ("newest", "Newest File"),
@@ -0,0 +1,123 @@
+# modules/hash_cache.py
+import os, sqlite3
+from threading import Lock
+from time import time
+
+# Entries not used by a scan for this long are checked against the disk and dropped if the file is gone
+STALE_AFTER_SECONDS = 24 * 60 * 60
+# Writes are committed in batches so scans running side by side don't hold the write lock for long
+COMMIT_EVERY = 500
+
+class HashCache:
+    """On-disk cache of content hashes keyed by (device, inode, size, mtime_ns).
+
+    A file that keeps the same inode, size and mtime is assumed unchanged, so
+    its hashes can be reused without reading it again.
+    """
+
+    def __init__(self, db_path, max_entries):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.lock = Lock()
+        self.hits = []
+        self.pending = 0
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS hashes (
+                dev INTEGER NOT NULL,
+                ino INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                path TEXT NOT NULL,
+                partial TEXT,
+                full TEXT,
+                last_seen REAL NOT NULL,
+                PRIMARY KEY (dev, ino, size, mtime_ns)
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_hashes_last_seen ON hashes (last_seen)")
+        self.conn.commit()
+
+    def get(self, key, column):
+        """Return the cached 'partial' or 'full' hash for key, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT {column} FROM hashes WHERE dev=? AND ino=? AND size=? AND mtime_ns=?", key
+            ).fetchone()
+            if row is None or row[0] is None:
+                return None
+            self.hits.append(key)
+            return row[0]
+
+    def put(self, key, column, value, path):
+        with self.lock:
+            try:
+                self.conn.execute(
+                    f"""INSERT INTO hashes (dev, ino, size, mtime_ns, path, {column}, last_seen)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (dev, ino, size, mtime_ns)
+                        DO UPDATE SET {column}=excluded.{column}, path=excluded.path, last_seen=excluded.last_seen""",
+                    (*key, path, value, time()),
+                )
+                self.pending += 1
+                if self.pending >= COMMIT_EVERY:
+                    self.conn.commit()
+                    self.pending = 0
+            except sqlite3.OperationalError as e:
+                # Another scan holds the database, the hash is simply not cached this time
+                print(f"Hash cache busy, not caching {path}: {e}")
+
+    def prune(self):
+        """Drop entries whose files are gone or changed, then enforce the size cap."""
+        now = time()
+        with self.lock:
+            # Refresh everything that was read during this scan
+            self.conn.executemany(
+                "UPDATE hashes SET last_seen=? WHERE dev=? AND ino=? AND size=? AND mtime_ns=?",
+                ((now, *key) for key in self.hits),
+            )
+            self.hits = []
+
+            stale = self.conn.execute(
+                "SELECT dev, ino, size, mtime_ns, path FROM hashes WHERE last_seen < ?",
+                (now - STALE_AFTER_SECONDS,),
+            ).fetchall()
+            gone = []
+            alive = []
+            for dev, ino, size, mtime_ns, path in stale:
+                key = (dev, ino, size, mtime_ns)
+                try:
+                    st = os.stat(path)
+                    if (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns) == key:
+                        alive.append(key)
+                        continue
+                except OSError:
+                    pass
+                gone.append(key)
+            self.conn.executemany(
+                "DELETE FROM hashes WHERE dev=? AND ino=? AND size=? AND mtime_ns=?", gone
+            )
+            self.conn.executemany(
+                "UPDATE hashes SET last_seen=? WHERE dev=? AND ino=? AND size=? AND mtime_ns=?",
+                ((now, *key) for key in alive),
+            )
+
+            # Keep at most max_entries, evicting the least recently used
+            count = self.conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+            if count > self.max_entries:
+                self.conn.execute(
+                    """DELETE FROM hashes WHERE rowid IN (
+                        SELECT rowid FROM hashes ORDER BY last_seen LIMIT ?
+                    )""",
+                    (count - self.max_entries,),
+                )
+            self.conn.commit()
+        if gone:
+            print(f"Hash cache: evicted {len(gone)} entries for missing or changed files.")
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
@@ -0,0 +1,95 @@
+# modules/hashing.py
+import hashlib
+
+# Bytes read from each end of a file for the partial hash
+PARTIAL_HASH_BYTES = 4 * 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def partial_hash(path, size, edge_bytes=PARTIAL_HASH_BYTES):
+    """Hash the first and last edge_bytes of a file.
+
+    Files no larger than two edges are read completely, so their partial hash
+    is also a full content hash.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        if size <= edge_bytes * 2:
+            while True:
+                chunk = f.read(HASH_CHUNK_SIZE)
+                if not chunk:
+                    break
+                h.update(chunk)
+        else:
+            h.update(f.read(edge_bytes))
+            f.seek(-edge_bytes, 2)
+            h.update(f.read(edge_bytes))
+    return h.hexdigest()
+
+def full_hash(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+def _group_by(items, key_func, is_canceled=None):
+    """Group items by key_func, dropping items that fail and groups with one member."""
+    groups = {}
+    for item in items:
+        if is_canceled and is_canceled():
+            return None
+        try:
+            key = key_func(item)
+        except OSError as e:
+            print(f"Error hashing {item[0]}: {e}")
+            continue
+        groups.setdefault(key, []).append(item)
+    return [group for group in groups.values() if len(group) > 1]
+
+def _cached_hash(cache, column, item, compute):
+    """Look up a hash in the cache before reading the file."""
+    key = item[2] if len(item) > 2 else None
+    if cache is None or key is None:
+        return compute()
+    value = cache.get(key, column)
+    if value is None:
+        value = compute()
+        cache.put(key, column, value, item[0])
+    return value
+
+def find_content_duplicates(candidates, is_canceled=None, cache=None):
+    """Split (path, size, cache key, ...) candidates into groups of files with identical content.
+
+    Runs size -> partial hash -> full hash, and each stage only sees the files
+    that still collide after the cheaper stage before it. Hashes are read from
+    and stored in cache (a HashCache) when one is given.
+    Returns a list of groups, or None if canceled.
+    """
+    matched = []
+    by_size = _group_by(candidates, lambda item: item[1])
+    for size_group in by_size:
+        size = size_group[0][1]
+        partial_groups = _group_by(
+            size_group,
+            lambda item: _cached_hash(cache, "partial", item, lambda: partial_hash(item[0], item[1])),
+            is_canceled,
+        )
+        if partial_groups is None:
+            return None
+        for partial_group in partial_groups:
+            if size <= PARTIAL_HASH_BYTES * 2:
+                # The partial hash already covered the whole file
+                matched.append(partial_group)
+                continue
+            full_groups = _group_by(
+                partial_group,
+                lambda item: _cached_hash(cache, "full", item, lambda: full_hash(item[0])),
+                is_canceled,
+            )
+            if full_groups is None:
+                return None
+            matched.extend(full_groups)
+    return matched
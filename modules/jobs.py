@@ -0,0 +1,158 @@
+# modules/jobs.py
+import uuid
+from collections import OrderedDict
+from threading import Thread, Event, Lock
+from time import time
+from modules.progress import ProgressChannel
+
+class Job:
+    """A scan or cleanup submitted to the JobManager."""
+
+    def __init__(self, kind, target, resources=(), params=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.target = target
+        self.resources = frozenset(resources)
+        self.params = params or {}
+        self.status = "queued"
+        self.created = time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.status_code = None
+        self.error = None
+        self.profile_file = None
+        self.cancel_event = Event()
+        self.events = ProgressChannel(self.id)
+        self.events.reset("queued")
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
+
+    def to_dict(self, include_result=False):
+        _, progress = self.events.snapshot()
+        data = {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "params": self.params,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "error": self.error,
+            "profile_file": self.profile_file,
+            "progress": {
+                "phase": progress.get("phase"),
+                "percent": progress.get("percent", 0),
+                "current_file": progress.get("current_file", ""),
+                "files_done": progress.get("files_done", 0),
+                "bytes_done": progress.get("bytes_done", 0),
+            },
+        }
+        if include_result:
+            data["result"] = self.result
+            data["status_code"] = self.status_code
+        return data
+
+class JobManager:
+    """Runs jobs on a bounded number of worker threads.
+
+    Jobs wait in a FIFO queue until a worker is free. A job whose resources
+    (the disks a scan walks, the CSV a cleanup works from) overlap a running
+    job is held back so the two never touch the same files, while later jobs
+    that don't conflict may start ahead of it. Finished jobs are kept for
+    lookups and evicted oldest first once more than max_finished are held.
+    """
+
+    def __init__(self, max_workers, max_finished):
+        self.max_workers = max(1, max_workers)
+        self.max_finished = max(1, max_finished)
+        self.lock = Lock()
+        self.jobs = OrderedDict()
+        self.queue = []
+        self.running = 0
+        self.busy = set()
+
+    def submit(self, kind, target, resources=(), params=None):
+        """Queue target(job), which returns (result, status code)."""
+        job = Job(kind, target, resources, params)
+        with self.lock:
+            self.jobs[job.id] = job
+            self.queue.append(job)
+            self._evict()
+            self._dispatch()
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self, kind=None):
+        with self.lock:
+            return [job for job in self.jobs.values() if kind is None or job.kind == kind]
+
+    def latest(self, kind, match=None):
+        """Most recently submitted job of a kind, optionally filtered by match(job)."""
+        for job in reversed(self.list(kind)):
+            if match is None or match(job):
+                return job
+        return None
+
+    def cancel(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or not job.active:
+                return job
+            job.cancel_event.set()
+            if job.status == "queued":
+                # Never started, finish it here
+                self.queue.remove(job)
+                self._finish(job, "canceled")
+                self._dispatch()
+        return job
+
+    def _dispatch(self):
+        """Start queued jobs while workers are free. Called with the lock held."""
+        while self.running < self.max_workers:
+            job = next((j for j in self.queue if not (j.resources & self.busy)), None)
+            if job is None:
+                return
+            self.queue.remove(job)
+            self.running += 1
+            self.busy |= job.resources
+            job.status = "running"
+            job.started = time()
+            job.events.update(phase="starting")
+            Thread(target=self._run, args=(job,), daemon=True).start()
+
+    def _run(self, job):
+        status = "done"
+        try:
+            job.result, job.status_code = job.target(job)
+            if job.cancel_event.is_set():
+                status = "canceled"
+            elif job.status_code and job.status_code >= 400:
+                status = "failed"
+        except Exception as e:
+            print(f"Exception in {job.kind} job {job.id}: {e}")
+            job.error = str(e)
+            status = "failed"
+        with self.lock:
+            self.running -= 1
+            self.busy -= job.resources
+            self._finish(job, status)
+            self._evict()
+            self._dispatch()
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished = time()
+        job.target = None
+        job.events.finish(status)
+
+    def _evict(self):
+        """Drop the oldest finished jobs beyond max_finished. Called with the lock held."""
+        finished = [job_id for job_id, job in self.jobs.items() if not job.active]
+        for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self.jobs[job_id]
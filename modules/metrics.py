@@ -0,0 +1,175 @@
+# modules/metrics.py
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter, time
+
+# Prefix of every exported metric
+METRIC_PREFIX = "udfh_"
+
+# name: (type, help)
+METRIC_HELP = {
+    "scans_total": ("counter", "Scans finished, by outcome."),
+    "scan_files_total": ("counter", "Files walked by scans, per disk."),
+    "scan_bytes_total": ("counter", "Bytes of the files walked by scans, per disk."),
+    "scan_stat_calls_total": ("counter", "stat calls made while walking, per disk."),
+    "scan_errors_total": ("counter", "Directories and files that could not be read while walking, per disk."),
+    "scan_skipped_files_total": ("counter", "Files left out by filters, the minimum size or for not being regular files, per disk."),
+    "last_scan_phase_seconds": ("gauge", "Time spent in each phase of the last scan."),
+    "last_scan_disk_seconds": ("gauge", "Time the last scan spent walking each disk."),
+    "last_scan_disk_files_per_second": ("gauge", "Files per second walked on each disk by the last scan."),
+    "last_scan_disk_bytes_per_second": ("gauge", "Bytes per second of files walked on each disk by the last scan."),
+    "cleanups_total": ("counter", "Cleanups finished, by action."),
+    "cleanup_files_total": ("counter", "Files processed by cleanups, by action, disk and result."),
+    "cleanup_bytes_total": ("counter", "Bytes of the files processed by cleanups, by action and disk."),
+    "last_cleanup_phase_seconds": ("gauge", "Time spent in each phase of the last cleanup of each action."),
+    "last_cleanup_disk_files_per_second": ("gauge", "Files per second processed on each disk by the last cleanup of each action."),
+    "last_cleanup_disk_bytes_per_second": ("gauge", "Bytes per second processed on each disk by the last cleanup of each action."),
+    "jobs": ("gauge", "Jobs currently known to the job manager, by kind and status."),
+}
+
+def _rate(amount, seconds):
+    return round(amount / seconds, 1) if seconds > 0 else 0.0
+
+class RunMetrics:
+    """Phase timings and per-disk counters of one scan or cleanup.
+
+    Phases may be timed more than once, their durations add up, so work that
+    is interleaved (sorting and writing each group in turn) can still be
+    reported per phase. Disk counters are updated from worker threads.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.started = time()
+        self.phases = {}
+        self.disks = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def timed(self, iterable, name):
+        """Iterate iterable, adding the time spent producing each item to phase name."""
+        iterator = iter(iterable)
+        while True:
+            start = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time(name, perf_counter() - start)
+                return
+            self.add_time(name, perf_counter() - start)
+            yield item
+
+    def add_disk(self, disk, files=0, nbytes=0, seconds=0.0, stat_calls=0, errors=0, skipped=0):
+        with self.lock:
+            stats = self.disks.get(disk)
+            if stats is None:
+                stats = self.disks[disk] = {
+                    "files": 0, "bytes": 0, "seconds": 0.0,
+                    "stat_calls": 0, "errors": 0, "skipped_files": 0,
+                }
+            stats["files"] += files
+            stats["bytes"] += nbytes
+            stats["seconds"] += seconds
+            stats["stat_calls"] += stat_calls
+            stats["errors"] += errors
+            stats["skipped_files"] += skipped
+
+    def as_dict(self):
+        with self.lock:
+            disks = {}
+            for disk, stats in self.disks.items():
+                disks[disk] = dict(stats)
+                disks[disk]["seconds"] = round(stats["seconds"], 4)
+                disks[disk]["files_per_sec"] = _rate(stats["files"], stats["seconds"])
+                disks[disk]["bytes_per_sec"] = _rate(stats["bytes"], stats["seconds"])
+            totals = {
+                key: sum(stats[key] for stats in self.disks.values())
+                for key in ("files", "bytes", "stat_calls", "errors", "skipped_files")
+            }
+            return {
+                "phases": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+                "disks": disks,
+                "totals": totals,
+            }
+
+class MetricsRegistry:
+    """Process-wide counters and gauges, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.values = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def replace(self, name, samples, **common):
+        """Drop every sample of gauge name matching the common labels, then set samples {labels: value}."""
+        common_items = set(common.items())
+        with self.lock:
+            for key in [k for k in self.values if k[0] == name and common_items <= set(k[1])]:
+                del self.values[key]
+            for labels, value in samples.items():
+                self.values[(name, tuple(sorted(dict(labels, **common).items())))] = value
+
+    def record_scan(self, metrics, status):
+        data = metrics.as_dict()
+        self.inc("scans_total", status=status)
+        for disk, stats in data["disks"].items():
+            self.inc("scan_files_total", stats["files"], disk=disk)
+            self.inc("scan_bytes_total", stats["bytes"], disk=disk)
+            self.inc("scan_stat_calls_total", stats["stat_calls"], disk=disk)
+            self.inc("scan_errors_total", stats["errors"], disk=disk)
+            self.inc("scan_skipped_files_total", stats["skipped_files"], disk=disk)
+        self.replace("last_scan_phase_seconds", {(("phase", p),): s for p, s in data["phases"].items()})
+        for name, field in (("last_scan_disk_seconds", "seconds"),
+                            ("last_scan_disk_files_per_second", "files_per_sec"),
+                            ("last_scan_disk_bytes_per_second", "bytes_per_sec")):
+            self.replace(name, {(("disk", d),): stats[field] for d, stats in data["disks"].items()})
+
+    def record_cleanup(self, action, metrics):
+        data = metrics.as_dict()
+        self.inc("cleanups_total", action=action)
+        for disk, stats in data["disks"].items():
+            self.inc("cleanup_files_total", stats["files"] - stats["errors"], action=action, disk=disk, result="ok")
+            self.inc("cleanup_files_total", stats["errors"], action=action, disk=disk, result="failed")
+            self.inc("cleanup_bytes_total", stats["bytes"], action=action, disk=disk)
+        self.replace("last_cleanup_phase_seconds", {(("phase", p),): s for p, s in data["phases"].items()}, action=action)
+        for name, field in (("last_cleanup_disk_files_per_second", "files_per_sec"),
+                            ("last_cleanup_disk_bytes_per_second", "bytes_per_sec")):
+            self.replace(name, {(("disk", d),): stats[field] for d, stats in data["disks"].items()}, action=action)
+
+    def render(self, extra=()):
+        """Prometheus text exposition of every sample, plus extra (name, labels, value) samples."""
+        with self.lock:
+            values = dict(self.values)
+        for name, labels, value in extra:
+            values[(name, tuple(sorted(labels.items())))] = value
+        by_name = {}
+        for (name, labels), value in sorted(values.items()):
+            by_name.setdefault(name, []).append((labels, value))
+        lines = []
+        for name, samples in by_name.items():
+            metric_type, help_text = METRIC_HELP.get(name, ("untyped", name))
+            lines.append(f"# HELP {METRIC_PREFIX}{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} {metric_type}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels)
+                lines.append(f"{METRIC_PREFIX}{name}{{{label_text}}} {value}" if label_text else f"{METRIC_PREFIX}{name} {value}")
+        return "\n".join(lines) + "\n"
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+registry = MetricsRegistry()
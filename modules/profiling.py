@@ -0,0 +1,159 @@
+# modules/profiling.py
+import os, sys, cProfile, pstats, threading
+from collections import Counter
+from datetime import datetime
+from threading import Lock, Event
+from config import PROFILE_MODE, PROFILE_SAMPLE_MS
+
+# Extension of the file each mode writes
+PROFILE_EXTENSIONS = {"cprofile": ".pstats", "sample": ".collapsed"}
+# Profiles kept in each output directory before the oldest are deleted
+PROFILE_KEEP_COUNT = 10
+
+# Before 3.12 cProfile hooks a single thread, from 3.12 on it uses
+# sys.monitoring, which sees every thread but allows one profiler at a time
+PER_THREAD_PROFILERS = sys.version_info < (3, 12)
+# Entry added to cProfile stats that can't be limited to the job's threads
+ALL_THREADS_NOTE = ("~", 0, "<note: profile covers every thread of the process, use PROFILE_MODE=sample for this job only>")
+
+# Only one job is profiled at a time, so threads of two jobs are never mixed up
+active_lock = Lock()
+# Session of the job running on this thread
+local = threading.local()
+
+def worker_initializer():
+    """Executor initializer that adds the pool's threads to the profile of the calling thread's job.
+
+    Call it on the job's thread when creating the executor. Returns None
+    when that job isn't being profiled.
+    """
+    session = getattr(local, "session", None)
+    return session.add_thread if session else None
+
+class CProfileSession:
+    """cProfile of the job thread and of the worker threads it starts.
+
+    Before Python 3.12 each worker thread added through worker_initializer
+    gets a profiler of its own, merged into the job's when it stops. From
+    3.12 on the job's profiler sees every thread of the process, including
+    other jobs and requests, and the saved stats carry ALL_THREADS_NOTE.
+    """
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.lock = Lock()
+        self.thread_profiles = []
+
+    def add_thread(self):
+        if not PER_THREAD_PROFILERS:
+            return
+        profile = cProfile.Profile()
+        with self.lock:
+            self.thread_profiles.append((threading.current_thread(), profile))
+        profile.enable()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self, path):
+        self.profile.disable()
+        stats = pstats.Stats(self.profile)
+        with self.lock:
+            thread_profiles = list(self.thread_profiles)
+        for thread, profile in thread_profiles:
+            # A profiler can only be stopped by its own thread, leave running ones out
+            if not thread.is_alive():
+                stats.add(profile)
+        if not PER_THREAD_PROFILERS:
+            stats.stats[ALL_THREADS_NOTE] = (0, 0, 0, 0, {})
+        stats.dump_stats(path)
+
+class SamplingSession:
+    """Samples the stacks of the job thread and the worker threads it starts.
+
+    Writes collapsed stacks (one "frame;frame;frame count" line per stack),
+    the input format of flame graph tools.
+    """
+
+    def __init__(self, interval_ms=PROFILE_SAMPLE_MS):
+        self.interval = max(interval_ms, 1) / 1000
+        self.stacks = Counter()
+        self.stop_event = Event()
+        self.sampler = threading.Thread(target=self._sample, name="profile-sampler", daemon=True)
+        self.threads = {threading.get_ident()}
+
+    def add_thread(self):
+        self.threads.add(threading.get_ident())
+
+    def _sample(self):
+        while not self.stop_event.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident not in self.threads:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+
+    def start(self):
+        self.sampler.start()
+
+    def stop(self, path):
+        self.stop_event.set()
+        self.sampler.join()
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+def clean_old_profiles(directory, keep_count=PROFILE_KEEP_COUNT):
+    profiles = sorted(
+        [f for f in os.scandir(directory) if f.name.startswith("profile_")],
+        key=lambda f: f.stat().st_mtime,
+        reverse=True
+    )
+    for old_file in profiles[keep_count:]:
+        try:
+            os.remove(old_file.path)
+            print(f"Deleted old profile: {old_file.path}")
+        except Exception as e:
+            print(f"Error deleting profile {old_file.path}: {e}")
+
+def run_profiled(func, output_dir, kind, mode=None):
+    """Call func() under a profiler and save the profile in output_dir.
+
+    Returns (func's result, profile file name). The name is None when
+    another job is already being profiled, func then runs unprofiled.
+    """
+    mode = mode or PROFILE_MODE
+    if mode not in PROFILE_EXTENSIONS:
+        print(f"Unknown profile mode {mode}, using cprofile")
+        mode = "cprofile"
+    if not active_lock.acquire(blocking=False):
+        print(f"Another job is being profiled, running this {kind} job without profiling")
+        return func(), None
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        # cProfile can't tell the job's threads apart on 3.12+, say so in the name
+        scope = "_all_threads" if mode == "cprofile" and not PER_THREAD_PROFILERS else ""
+        filename = f"profile_{kind}_{timestamp}{scope}{PROFILE_EXTENSIONS[mode]}"
+        session = CProfileSession() if mode == "cprofile" else SamplingSession()
+        session.start()
+        local.session = session
+        try:
+            result = func()
+        finally:
+            local.session = None
+            # Failed jobs are the ones most worth a profile
+            try:
+                session.stop(os.path.join(output_dir, filename))
+                print(f"Profile saved to: {os.path.join(output_dir, filename)}")
+            except Exception as e:
+                print(f"Error saving profile: {e}")
+                filename = None
+        clean_old_profiles(output_dir)
+        return result, filename
+    finally:
+        active_lock.release()
@@ -0,0 +1,197 @@
+# modules/progress.py
+import sys, json
+from threading import Condition, Lock, local
+from time import time, monotonic, sleep
+from config import PROGRESS_BATCH_FILES, PROGRESS_INTERVAL_MS, CONSOLE_PROGRESS
+
+# Shortest gap between two events on one stream, updates in between are coalesced
+EVENT_MIN_INTERVAL = 0.25
+# Seconds without a change before a keep-alive comment is sent
+EVENT_KEEPALIVE = 15
+
+class ProgressChannel:
+    """Latest progress of a job, pushed to Server-Sent Events subscribers.
+
+    Producers overwrite fields with update(). Subscribers wake up on a change
+    but only ever see the newest state, so a burst of updates turns into a
+    single event.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.condition = Condition()
+        self.version = 0
+        self.state = {}
+        self.reset()
+
+    def reset(self, phase="idle"):
+        with self.condition:
+            self.state = {
+                "job": self.job,
+                "phase": phase,
+                "percent": 0,
+                "current_file": "",
+                "file_percent": 0,
+                "files_done": 0,
+                "bytes_done": 0,
+                "done": False,
+                "started": time(),
+            }
+            self.version += 1
+            self.condition.notify_all()
+
+    def update(self, **fields):
+        with self.condition:
+            self.state.update(fields)
+            self.version += 1
+            self.condition.notify_all()
+
+    def finish(self, phase="done", **fields):
+        self.update(phase=phase, percent=100, file_percent=0, current_file="", done=True, **fields)
+
+    def snapshot(self):
+        with self.condition:
+            return self.version, dict(self.state)
+
+    def wait(self, version, timeout):
+        """Block until the state differs from version, or timeout passes."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != version, timeout)
+            return self.version, dict(self.state)
+
+    def stream(self, min_interval=EVENT_MIN_INTERVAL, keepalive=EVENT_KEEPALIVE):
+        """Yield SSE messages until the job is done.
+
+        Rates are worked out from the counters between two events, so the
+        producers only have to keep totals.
+        """
+        version = None
+        last_time = None
+        last_files = last_bytes = 0
+        while True:
+            new_version, state = self.wait(version, keepalive)
+            if new_version == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = new_version
+
+            now = monotonic()
+            files_done = state.get("files_done", 0)
+            bytes_done = state.get("bytes_done", 0)
+            if last_time is None or files_done < last_files:
+                # First event, or the job was restarted: average since it began
+                elapsed = max(time() - state.get("started", time()), 1e-6)
+                state["files_per_sec"] = round(files_done / elapsed, 1)
+                state["bytes_per_sec"] = int(bytes_done / elapsed)
+            else:
+                elapsed = max(now - last_time, 1e-6)
+                state["files_per_sec"] = round((files_done - last_files) / elapsed, 1)
+                state["bytes_per_sec"] = int(max(bytes_done - last_bytes, 0) / elapsed)
+            last_time, last_files, last_bytes = now, files_done, bytes_done
+
+            yield f"event: progress\ndata: {json.dumps(state)}\n\n"
+            if state.get("done"):
+                return
+            # Bound the event rate, anything published meanwhile is folded into the next event
+            sleep(min_interval)
+
+def console_progress_enabled():
+    if CONSOLE_PROGRESS in ("1", "true", "yes", "on"):
+        return True
+    if CONSOLE_PROGRESS in ("0", "false", "no", "off"):
+        return False
+    return sys.stderr.isatty()
+
+def _console_bar(desc, total, unit):
+    if not console_progress_enabled():
+        return None
+    try:
+        from tqdm import tqdm
+    except ImportError:
+        return None
+    return tqdm(total=total, desc=desc, unit=unit)
+
+class ProgressReporter:
+    """Batches per-file progress and publishes it every N files or T milliseconds.
+
+    Each worker thread counts into its own local counter, so the hot loop only
+    touches a shared lock when a batch is handed over. Publishing works out
+    the percentage with percent(files, bytes), then writes it to the event
+    channel and, when shown, the console bar.
+    """
+
+    def __init__(self, channel=None, percent=None,
+                 batch_files=None, interval_ms=None, desc=None, total=None, unit="file"):
+        self.channel = channel
+        self.percent = percent or (lambda files, nbytes: 0)
+        self.batch_files = max(1, batch_files or PROGRESS_BATCH_FILES)
+        self.interval = (PROGRESS_INTERVAL_MS if interval_ms is None else interval_ms) / 1000
+        self.lock = Lock()
+        self.files = 0
+        self.bytes = 0
+        self.current_file = ""
+        self.local = local()
+        self.counters = []
+        self.pbar = _console_bar(desc, total, unit) if desc else None
+
+    def add(self, nbytes=0, current_file=None, files=1):
+        """Count finished files for the calling thread, publishing when a batch is full or due."""
+        counter = getattr(self.local, "counter", None)
+        if counter is None:
+            counter = self.local.counter = [0, 0, None, monotonic() + self.interval]
+            with self.lock:
+                self.counters.append(counter)
+        counter[0] += files
+        counter[1] += nbytes
+        if current_file is not None:
+            counter[2] = current_file
+        if counter[0] >= self.batch_files or monotonic() >= counter[3]:
+            self._flush_counter(counter)
+
+    def _flush_counter(self, counter):
+        files, nbytes, current_file = counter[0], counter[1], counter[2]
+        counter[0] = counter[1] = 0
+        counter[3] = monotonic() + self.interval
+        if files or nbytes:
+            self.publish(files, nbytes, current_file)
+
+    def flush(self):
+        """Publish what the calling thread has counted so far."""
+        counter = getattr(self.local, "counter", None)
+        if counter is not None:
+            self._flush_counter(counter)
+
+    def publish(self, files=0, nbytes=0, current_file=None):
+        """Add to the totals and publish them straight away."""
+        with self.lock:
+            self.files += files
+            self.bytes += nbytes
+            if current_file is not None:
+                self.current_file = current_file
+            percent = self.percent(self.files, self.bytes)
+            if self.channel is not None:
+                self.channel.update(
+                    percent=percent, current_file=self.current_file,
+                    files_done=self.files, bytes_done=self.bytes,
+                )
+            if self.pbar is not None and files:
+                self.pbar.update(files)
+        return percent
+
+    def start_file(self, current_file):
+        """Show a file straight away, for operations slow enough that batching would hide it."""
+        self.publish(current_file=current_file)
+
+    def set_total(self, total):
+        if self.pbar is not None:
+            self.pbar.total = total
+            self.pbar.refresh()
+
+    def close(self):
+        """Publish every thread's remaining counts. Call once the workers are done."""
+        with self.lock:
+            counters = list(self.counters)
+        for counter in counters:
+            self._flush_counter(counter)
+        if self.pbar is not None:
+            self.pbar.close()
@@ -0,0 +1,35 @@
+# modules/records.py
+import os
+
+class FileRecord:
+    """Compact per-file scan record.
+
+    The disk is stored as an index into the scan's disk table and the path is
+    kept relative to it, so the full path string only exists while output is
+    being written.
+    """
+
+    __slots__ = ("disk_id", "rel_path", "size", "mtime_ns", "dev", "ino")
+
+    def __init__(self, disk_id, rel_path, size, mtime_ns, dev, ino):
+        self.disk_id = disk_id
+        self.rel_path = rel_path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.dev = dev
+        self.ino = ino
+
+    @property
+    def mtime(self):
+        # Same float os.stat() gives for st_mtime
+        return self.mtime_ns // 1000000000 + (self.mtime_ns % 1000000000) * 1e-9
+
+    @property
+    def cache_key(self):
+        return (self.dev, self.ino, self.size, self.mtime_ns)
+
+    def full_path(self, disks):
+        return os.path.join(disks[self.disk_id], self.rel_path)
+
+    def as_tuple(self):
+        return (self.disk_id, self.rel_path, self.size, self.mtime_ns, self.dev, self.ino)
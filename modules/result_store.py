@@ -0,0 +1,232 @@
+# modules/result_store.py
+import os, sqlite3
+from contextlib import closing
+
+# Rows written per executemany call while a scan stores its groups
+INSERT_BATCH_SIZE = 5000
+# Rows fetched at a time when a cleanup streams its files
+FETCH_BATCH_SIZE = 1000
+
+# Sort keys accepted by query_groups, mapped to trusted column names
+GROUP_SORTS = {
+    "group": "group_id",
+    "path": "rel_path",
+    "size": "size",
+    "files": "file_count",
+    "reclaimable": "reclaimable",
+}
+
+SCHEMA = """
+CREATE TABLE groups (
+    group_id INTEGER PRIMARY KEY,
+    rel_path TEXT NOT NULL,
+    ext TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    file_count INTEGER NOT NULL,
+    reclaimable INTEGER NOT NULL,
+    verified TEXT NOT NULL
+);
+CREATE TABLE files (
+    group_id INTEGER NOT NULL,
+    rel_path TEXT NOT NULL,
+    full_path TEXT NOT NULL,
+    disk TEXT NOT NULL,
+    drive TEXT NOT NULL,
+    ext TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    keep INTEGER NOT NULL,
+    hardlink INTEGER NOT NULL
+);
+"""
+
+# Built once all rows are in, which is much faster than updating them on every insert
+INDEXES = """
+CREATE INDEX files_group ON files (group_id);
+CREATE INDEX files_drive ON files (drive, group_id);
+CREATE INDEX files_disk_keep ON files (disk, keep);
+CREATE INDEX files_size ON files (size);
+CREATE INDEX files_ext ON files (ext);
+CREATE INDEX groups_size ON groups (size);
+CREATE INDEX groups_reclaimable ON groups (reclaimable);
+CREATE INDEX groups_ext ON groups (ext);
+"""
+
+def store_path_for(csv_path):
+    """The result store written next to a scan CSV."""
+    return os.path.splitext(csv_path)[0] + ".sqlite3"
+
+def file_ext(path):
+    return os.path.splitext(path)[1].lower()
+
+class ResultStoreWriter:
+    """Writes the duplicate groups of a scan to an indexed SQLite file.
+
+    The store is built under a temporary name and only renamed into place by
+    finish(), so a reader never sees a half-written store.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        self.conn = sqlite3.connect(self.tmp_path)
+        # Nothing reads the store until it is renamed, so durability can wait until then
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.executescript(SCHEMA)
+        self.group_rows = []
+        self.file_rows = []
+
+    def add_group(self, group_id, rows, verified):
+        """Add a group from (rel_path, full_path, disk, drive, mtime, size, keep, hardlink) rows, kept file first.
+
+        hardlink marks a path sharing its inode with an earlier row, its size
+        is only reclaimed once.
+        """
+        rel_path = rows[0][0]
+        size = max(row[5] for row in rows)
+        reclaimable = sum(row[5] for row in rows if not row[6] and not row[7])
+        self.group_rows.append((group_id, rel_path, file_ext(rel_path), size, len(rows), reclaimable, verified))
+        for row_rel_path, full_path, disk, drive, mtime, file_size, keep, hardlink in rows:
+            self.file_rows.append((
+                group_id, row_rel_path, full_path, disk, drive,
+                file_ext(row_rel_path), mtime, file_size, 1 if keep else 0, 1 if hardlink else 0,
+            ))
+        if len(self.file_rows) >= INSERT_BATCH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        self.conn.executemany("INSERT INTO groups VALUES (?, ?, ?, ?, ?, ?, ?)", self.group_rows)
+        self.conn.executemany("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", self.file_rows)
+        self.group_rows = []
+        self.file_rows = []
+
+    def finish(self):
+        self._flush()
+        self.conn.executescript(INDEXES)
+        self.conn.commit()
+        self.conn.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        try:
+            self.conn.close()
+        finally:
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+
+class ResultStore:
+    """Read access to the result store of one scan.
+
+    Every call opens its own short-lived connection, so one store can be
+    shared by request handlers and cleanup worker threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def for_csv(cls, csv_path):
+        """The store written with csv_path, or None for scans made before stores existed."""
+        path = store_path_for(csv_path)
+        return cls(path) if os.path.isfile(path) else None
+
+    def _connect(self):
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def query_groups(self, page=1, per_page=50, drive=None, ext=None, min_size=None, max_size=None,
+                     search=None, sort="group", descending=False):
+        """One page of groups with their files, and the number of groups matching the filters."""
+        where = []
+        params = []
+        if drive:
+            where.append("group_id IN (SELECT group_id FROM files WHERE drive = ?)")
+            params.append(drive)
+        if ext:
+            ext = ext.lower()
+            where.append("ext = ?")
+            params.append(ext if ext.startswith(".") else "." + ext)
+        if min_size is not None:
+            where.append("size >= ?")
+            params.append(min_size)
+        if max_size is not None:
+            where.append("size <= ?")
+            params.append(max_size)
+        if search:
+            where.append("rel_path LIKE ? ESCAPE '\\'")
+            escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.append(f"%{escaped}%")
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+        order_sql = f"{GROUP_SORTS.get(sort, 'group_id')} {'DESC' if descending else 'ASC'}, group_id"
+
+        page = max(1, page)
+        per_page = max(1, per_page)
+        with closing(self._connect()) as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM groups {where_sql}", params).fetchone()[0]
+            groups = [dict(row) for row in conn.execute(
+                f"SELECT * FROM groups {where_sql} ORDER BY {order_sql} LIMIT ? OFFSET ?",
+                params + [per_page, (page - 1) * per_page],
+            )]
+            if groups:
+                by_id = {group["group_id"]: group for group in groups}
+                for group in groups:
+                    group["files"] = []
+                placeholders = ",".join("?" * len(by_id))
+                for row in conn.execute(
+                    f"SELECT group_id, full_path, drive, mtime, size, keep, hardlink FROM files "
+                    f"WHERE group_id IN ({placeholders}) ORDER BY group_id, keep DESC, rowid",
+                    list(by_id),
+                ):
+                    file_row = dict(row)
+                    file_row["keep"] = bool(file_row["keep"])
+                    file_row["hardlink"] = bool(file_row["hardlink"])
+                    by_id[file_row.pop("group_id")]["files"].append(file_row)
+        return total, groups
+
+    def drives(self):
+        with closing(self._connect()) as conn:
+            return [row[0] for row in conn.execute("SELECT DISTINCT drive FROM files ORDER BY drive")]
+
+    def cleanup_disks(self):
+        """{disk: (file count, total size)} of the files marked Keep = no."""
+        with closing(self._connect()) as conn:
+            return {
+                row[0]: (row[1], row[2] or 0)
+                for row in conn.execute(
+                    "SELECT disk, COUNT(*), SUM(size) FROM files WHERE keep = 0 GROUP BY disk"
+                )
+            }
+
+    def cleanup_files(self, disk):
+        """Stream (full path, size) of the files on disk marked Keep = no."""
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "SELECT full_path, size FROM files WHERE disk = ? AND keep = 0 ORDER BY rowid", (disk,)
+            )
+            while True:
+                rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+                if not rows:
+                    return
+                for full_path, size in rows:
+                    yield full_path, size
+
+    def link_files(self, disk):
+        """Stream (full path, size, kept path, verified) of the files on disk marked Keep = no."""
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                # Every path of a kept file is kept, any of them can be linked to
+                "SELECT f.full_path, f.size, (SELECT k.full_path FROM files k "
+                "WHERE k.group_id = f.group_id AND k.keep = 1 ORDER BY k.rowid LIMIT 1), g.verified "
+                "FROM files f JOIN groups g ON g.group_id = f.group_id "
+                "WHERE f.disk = ? AND f.keep = 0 ORDER BY f.rowid", (disk,)
+            )
+            while True:
+                rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+                if not rows:
+                    return
+                for full_path, size, kept_path, verified in rows:
+                    yield full_path, size, kept_path, verified == "verified"
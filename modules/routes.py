@@ -1,24 +1,43 @@
-﻿from flask import Blueprint, render_template, redirect, url_for, request, flash, current_app, jsonify, send_from_directory
-from modules.scan import scan_for_duplicates, get_array_drives, get_pool_drives, SCAN_PROGRESS, is_canceled
-from modules.cleanup import write_cleanup_results, delete_duplicates_logic, move_duplicates_logic, CLEANUP_PROGRESS, CURRENT_FILE_PROGRESS, CURRENT_FILE_NAME
+﻿from flask import Blueprint, render_template, redirect, url_for, request, flash, current_app, jsonify, send_from_directory, Response
+from modules.scan import scan_for_duplicates, get_array_drives, get_pool_drives
+from modules.cleanup import delete_duplicates_logic, move_duplicates_logic, link_duplicates_logic
 from modules.forms import ScanForm
-from config import APP_NAME, APP_VERSION
-from threading import Thread, Event, Lock
+from modules.jobs import JobManager
+from modules.result_store import ResultStore
+from modules.catalog import scan_catalog, cleanup_catalog
+from modules.metrics import registry
+from modules.profiling import run_profiled
+from config import APP_NAME, APP_VERSION, JOB_WORKERS, JOB_HISTORY, PROFILE_JOBS
 from werkzeug.datastructures import MultiDict
-import os, glob, json, csv, shutil
+from collections import Counter
+import os, json, csv, shutil
 
 # Create a Blueprint for routes
 routes = Blueprint("routes", __name__)
 
-# Global variables
-scan_summary_data = None
-scan_complete_event = Event()
-scan_summary_lock = Lock()
-is_scanning = False  # Flag to track if a scan is in progress
-is_scanning_lock = Lock()  # Lock for thread-safe access to is_scanning
-is_canceled = False
-cleanup_results = {}
-cleanup_threads = {}
+# Scans and cleanups run as jobs and are looked up by job id
+jobs = JobManager(JOB_WORKERS, JOB_HISTORY)
+CLEANUP_KINDS = ("delete", "move", "link")
+
+def latest_cleanup_job(csv_file=None):
+    """Most recent delete, move or link job, optionally for one scan CSV."""
+    return jobs.latest(None, lambda job: job.kind in CLEANUP_KINDS and (
+        csv_file is None or job.params.get("csv_file") == csv_file
+    ))
+
+def profile_requested():
+    """Whether a cleanup request asked to be profiled with ?profile=1."""
+    return request.args.get("profile", "").lower() in ("1", "true", "yes")
+
+def run_job(job, profile_dir, target):
+    """Run target() for a job, under the profiler if the job or PROFILE_JOBS asks for it."""
+    if not (PROFILE_JOBS or job.params.get("profile")):
+        return target()
+    (result, status_code), profile_file = run_profiled(target, profile_dir, job.kind)
+    job.profile_file = profile_file
+    if profile_file and isinstance(result, dict):
+        result["profile_file"] = profile_file
+    return result, status_code
 
 @routes.route("/")
 def index():
@@ -26,9 +45,8 @@ def index():
 
 @routes.route("/scan", methods=["GET"])
 def scan():
-    global is_scanning
     form = ScanForm()
-    scanning = is_scanning
+    scanning = jobs.latest("scan", lambda job: job.active) is not None
 
     # Determine source choice from request args or fallback to "1"
     source_choice = request.args.get("source_choice") or "1"
@@ -61,15 +79,58 @@ def cleanup():
 
 @routes.route("/progress", methods=["GET"])
 def progress():
-    with SCAN_PROGRESS.get_lock():
-        progress = SCAN_PROGRESS.value
-    return {"progress": progress}
+    """Progress of the most recent scan (kept for clients that don't use job ids)."""
+    job = jobs.latest("scan")
+    return {"progress": job.events.snapshot()[1]["percent"] if job else 0}
 
 @routes.route("/cleanup_progress", methods=["GET"])
 def cleanup_progress():
-    with CLEANUP_PROGRESS.get_lock():
-        progress = CLEANUP_PROGRESS.value
-    return {"progress": progress}
+    """Progress of the most recent cleanup (kept for clients that don't use job ids)."""
+    job = latest_cleanup_job()
+    return {"progress": job.events.snapshot()[1]["percent"] if job else 0}
+
+@routes.route("/jobs", methods=["GET"])
+def list_jobs():
+    return jsonify({"jobs": [job.to_dict() for job in jobs.list()]})
+
+@routes.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found."}), 404
+    return jsonify(job.to_dict(include_result=True))
+
+@routes.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    job = jobs.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found."}), 404
+    return jsonify(job.to_dict())
+
+@routes.route("/metrics", methods=["GET"])
+def metrics():
+    """Scan and cleanup metrics in the Prometheus text format."""
+    job_counts = Counter((job.kind, job.status) for job in jobs.list())
+    extra = [("jobs", {"kind": kind, "status": status}, count) for (kind, status), count in job_counts.items()]
+    return Response(registry.render(extra=extra), mimetype="text/plain; version=0.0.4")
+
+@routes.route("/events/<job_id>", methods=["GET"])
+def events(job_id):
+    """Server-Sent Events stream with the progress of one job."""
+    # "scan" and "cleanup" follow the most recent job of that kind
+    if job_id == "scan":
+        job = jobs.latest("scan")
+    elif job_id == "cleanup":
+        job = latest_cleanup_job()
+    else:
+        job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found."}), 404
+    return Response(
+        job.events.stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @routes.route("/get_drives/<source_choice>", methods=["GET"])
 def get_drives(source_choice):
@@ -83,13 +144,6 @@ def get_drives(source_choice):
 
 @routes.route("/start_scan", methods=["POST"])
 def start_scan():
-    global scan_summary_data, is_scanning
-
-    with is_scanning_lock:
-        if is_scanning:
-            return jsonify({"error": "A scan is already in progress. Please wait for it to complete."}), 400
-        is_scanning = True
-
     # Get source choice first (before form)
     source_choice = request.form.get("source_choice") or "1"
     available_drives = {
@@ -107,68 +161,72 @@ def start_scan():
         selected_disks = form.drives.data
         min_size = int(form.min_size.data or 0)
         ext_filter = [ext.strip() for ext in (form.ext_filter.data or "").split(",") if ext.strip()]
+        exclude_patterns = [p.strip() for p in (form.exclude_patterns.data or "").split(",") if p.strip()]
+        include_patterns = [p.strip() for p in (form.include_patterns.data or "").split(",") if p.strip()]
         keep_strategy = [
             form.keep_primary.data,
             form.keep_tiebreaker1.data,
             form.keep_tiebreaker2.data,
         ]
         keep_strategy = [s for s in keep_strategy if s]  # Remove blanks
+        verify_content = bool(form.verify_content.data)
+        match_mode = form.match_mode.data or "path"
+        incremental = not form.full_rescan.data
+        resume = bool(form.resume.data)
+        keep_partial = bool(form.keep_partial.data)
+        profile = bool(form.profile.data)
 
         app = current_app._get_current_object()
-
-        # Reset scan state
-        scan_complete_event.clear()
-        with scan_summary_lock:
-            scan_summary_data = None
-        with SCAN_PROGRESS.get_lock():
-            SCAN_PROGRESS.value = 0
-
-        def run_scan():
-            global scan_summary_data, is_scanning
-            try:
-                result = scan_for_duplicates(
-                    selected_disks, min_size, ext_filter, keep_strategy, app
-                )
-                if result is not None:
-                    with scan_summary_lock:
-                        scan_summary_data = result
-                    scan_complete_event.set()
-                else:
-                    scan_complete_event.set()
-            except Exception as e:
-                print(f"Exception during scan: {e}")
-            finally:
-                with is_scanning_lock:
-                    is_scanning = False
-
-        thread = Thread(target=run_scan, daemon=True)
-        thread.start()
-        return "", 200
+        scan_dir = os.path.join(current_app.root_path, "static", "output", "scan_results")
+
+        def scan(job):
+            result = scan_for_duplicates(
+                selected_disks, min_size, ext_filter, keep_strategy, app,
+                verify_content=verify_content,
+                match_mode=match_mode,
+                incremental=incremental,
+                exclude_patterns=exclude_patterns,
+                include_patterns=include_patterns,
+                events=job.events,
+                cancel_event=job.cancel_event,
+                resume=resume,
+                keep_partial=keep_partial,
+            )
+            return result, 200
+
+        def run_scan(job):
+            return run_job(job, scan_dir, lambda: scan(job))
+
+        # Scans of the same disk wait for each other, scans of other disks run alongside
+        job = jobs.submit(
+            "scan", run_scan, resources=selected_disks,
+            params={
+                "disks": selected_disks, "match_mode": match_mode, "resume": resume,
+                "keep_partial": keep_partial, "profile": profile,
+            },
+        )
+        return jsonify({"job_id": job.id}), 202
     else:
-        with is_scanning_lock:
-            is_scanning = False
         return jsonify({"error": "Invalid form submission", "details": form.errors}), 400
 
 @routes.route("/scan-summary", methods=["GET"])
 def scan_summary():
-    """Return the scan summary."""
-    global scan_summary_data  # Ensure this is accessible
-    if not scan_complete_event.is_set():
-        print("Scan summary requested but scan is still in progress.")
+    """Return the summary of the most recent scan."""
+    job = jobs.latest("scan")
+    if job is None or job.active:
         return jsonify({"error": "Scan is still in progress."}), 202  # Return 202 Accepted if scan is not complete
-    print("Scan summary content:", scan_summary_data)
     try:
-        with scan_summary_lock:
-            return jsonify(scan_summary_data)
+        return jsonify(job.result)
     except TypeError as e:
-        print("Error serializing scan_summary_data:", e)
-        return jsonify({"error": "Scan summary contains non-serializable data.", "details": str(scan_summary_data)}), 500
+        print("Error serializing scan summary:", e)
+        return jsonify({"error": "Scan summary contains non-serializable data.", "details": str(job.result)}), 500
 
 @routes.route("/cancel_scan", methods=["POST"])
 def cancel_scan():
-    from modules import scan
-    scan.is_canceled = True
-    print("DEBUG: is_canceled set to True from /cancel_scan")
+    """Cancel every queued or running scan."""
+    for job in jobs.list("scan"):
+        if job.active:
+            jobs.cancel(job.id)
     return jsonify({"message": "Scan canceled successfully."}), 200
 
 @routes.route("/download_csv/<filename>")
@@ -190,40 +248,95 @@ def download_csv(filename):
     # Not found
     return "File not found", 404
 
+def catalog_response(catalog, key):
+    """List a catalog's entries, or 304 if the client already has this revision."""
+    etag = catalog.etag()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        etag, entries = catalog.entries()
+        response = jsonify({key: entries})
+    response.set_etag(etag)
+    # Revalidate every time, the ETag keeps that to a 304 while nothing changed
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
 @routes.route("/list_scan_summaries")
 def list_scan_summaries():
     output_dir = os.path.join(current_app.root_path, "static", "output", "scan_results")
-    summaries = []
-    for json_path in sorted(glob.glob(os.path.join(output_dir, "duplicates_*.json")), reverse=True):
-        try:
-            with open(json_path, "r") as f:
-                summary = json.load(f)
-                # Only include if there are duplicates and a CSV file
-                if summary.get("csv_file") and summary.get("total_duplicates") and summary.get("total_duplicates") != "0":
-                    summaries.append(summary)
-        except Exception as e:
-            print(f"Error reading summary {json_path}: {e}")
-    return jsonify({"summaries": summaries})
+    # Only scans with duplicates and a CSV file are catalogued
+    return catalog_response(scan_catalog(output_dir), "summaries")
+
+def int_arg(name, default=None, minimum=None, maximum=None):
+    """Integer query argument, clamped to [minimum, maximum]; default if missing or invalid."""
+    try:
+        value = int(request.args.get(name, ""))
+    except ValueError:
+        return default
+    if minimum is not None:
+        value = max(value, minimum)
+    if maximum is not None:
+        value = min(value, maximum)
+    return value
+
+@routes.route("/results/<csv_file>/groups")
+def result_groups(csv_file):
+    """One page of a scan's duplicate groups, filtered and sorted by the query string."""
+    if "/" in csv_file or "\\" in csv_file or not csv_file.endswith(".csv"):
+        return jsonify({"error": "Invalid file name."}), 400
+    scan_dir = os.path.join(current_app.root_path, "static", "output", "scan_results")
+    store = ResultStore.for_csv(os.path.join(scan_dir, csv_file))
+    if store is None:
+        return jsonify({"error": "No result store for this scan, download the CSV instead."}), 404
+
+    page = int_arg("page", 1, minimum=1)
+    per_page = int_arg("per_page", 50, minimum=1, maximum=500)
+    try:
+        total, groups = store.query_groups(
+            page=page,
+            per_page=per_page,
+            drive=request.args.get("drive") or None,
+            ext=request.args.get("ext") or None,
+            min_size=int_arg("min_size"),
+            max_size=int_arg("max_size"),
+            search=request.args.get("q") or None,
+            sort=request.args.get("sort", "group"),
+            descending=request.args.get("order", "asc").lower() == "desc",
+        )
+        drives = store.drives()
+    except Exception as e:
+        print(f"Error querying result store for {csv_file}: {e}")
+        return jsonify({"error": f"Failed to read results: {e}"}), 500
+    return jsonify({
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "pages": (total + per_page - 1) // per_page,
+        "drives": drives,
+        "groups": groups,
+    })
 
 @routes.route("/delete_duplicates/<csv_file>", methods=["POST"])
 def delete_duplicates(csv_file):
     app = current_app._get_current_object()
-    def run_cleanup():
+    cleanup_dir = os.path.join(current_app.root_path, "static", "output", "cleanup_results")
+    def run_cleanup(job):
         with app.app_context():
-            result, status = delete_duplicates_logic(csv_file)
-            cleanup_results[csv_file] = (result, status)
-    with CLEANUP_PROGRESS.get_lock():
-        CLEANUP_PROGRESS.value = 0
-    thread = Thread(target=run_cleanup, daemon=True)
-    cleanup_threads[csv_file] = thread
-    thread.start()
-    return jsonify({"started": True}), 202
+            return run_job(job, cleanup_dir, lambda: delete_duplicates_logic(
+                csv_file, events=job.events, cancel_event=job.cancel_event
+            ))
+    job = jobs.submit(
+        "delete", run_cleanup, resources=[f"csv:{csv_file}"],
+        params={"csv_file": csv_file, "profile": profile_requested()},
+    )
+    return jsonify({"started": True, "job_id": job.id}), 202
 
 @routes.route("/cleanup_result/<csv_file>")
 def cleanup_result(csv_file):
-    result = cleanup_results.get(csv_file)
-    if result:
-        return jsonify(result[0]), result[1]
+    """Result of the most recent cleanup of a scan CSV."""
+    job = latest_cleanup_job(csv_file)
+    if job is not None and not job.active and job.result is not None:
+        return jsonify(job.result), job.status_code or 200
     return jsonify({"status": "running"}), 202
 
 @routes.route("/move_duplicates/<csv_file>", methods=["POST"])
@@ -231,17 +344,36 @@ def move_duplicates(csv_file):
     data = request.get_json()
     destination = data.get("destination") if data else None
     app = current_app._get_current_object()  # Capture the app object
+    cleanup_dir = os.path.join(current_app.root_path, "static", "output", "cleanup_results")
 
-    def run_move():
+    def run_move(job):
         with app.app_context():  # Use the captured app object
-            result, status = move_duplicates_logic(csv_file, destination)
-            cleanup_results[csv_file] = (result, status)
-    with CLEANUP_PROGRESS.get_lock():
-        CLEANUP_PROGRESS.value = 0
-    thread = Thread(target=run_move, daemon=True)
-    cleanup_threads[csv_file] = thread
-    thread.start()
-    return jsonify({"started": True}), 202
+            return run_job(job, cleanup_dir, lambda: move_duplicates_logic(
+                csv_file, destination, events=job.events, cancel_event=job.cancel_event
+            ))
+    job = jobs.submit(
+        "move", run_move, resources=[f"csv:{csv_file}"],
+        params={"csv_file": csv_file, "destination": destination, "profile": profile_requested()},
+    )
+    return jsonify({"started": True, "job_id": job.id}), 202
+
+@routes.route("/link_duplicates/<csv_file>", methods=["POST"])
+def link_duplicates(csv_file):
+    data = request.get_json(silent=True) or {}
+    method = data.get("method") or "hardlink"
+    app = current_app._get_current_object()
+    cleanup_dir = os.path.join(current_app.root_path, "static", "output", "cleanup_results")
+
+    def run_link(job):
+        with app.app_context():
+            return run_job(job, cleanup_dir, lambda: link_duplicates_logic(
+                csv_file, method, events=job.events, cancel_event=job.cancel_event
+            ))
+    job = jobs.submit(
+        "link", run_link, resources=[f"csv:{csv_file}"],
+        params={"csv_file": csv_file, "method": method, "profile": profile_requested()},
+    )
+    return jsonify({"started": True, "job_id": job.id}), 202
 
 @routes.route("/list_dirs", methods=["POST"])
 def list_dirs():
@@ -265,27 +397,10 @@ def cleanup_history():
 @routes.route("/list_cleanup_history")
 def list_cleanup_history():
     output_dir = os.path.join(current_app.root_path, "static", "output", "cleanup_results")
-    history = []
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
-    for json_path in sorted(glob.glob(os.path.join(output_dir, "cleanup_*.json")), reverse=True):
-        try:
-            with open(json_path, "r") as f:
-                summary = json.load(f)
-                # Only include summary fields, not large arrays
-                history.append({
-                    "timestamp": summary.get("timestamp"),
-                    "action": summary.get("action"),
-                    "original_csv": summary.get("original_csv"),
-                    "total_attempted": summary.get("total_attempted"),
-                    "total_deleted": summary.get("total_deleted"),
-                    "total_moved": summary.get("total_moved"),
-                    "total_failed": summary.get("total_failed"),
-                    "filename": os.path.basename(json_path)
-                })
-        except Exception as e:
-            print(f"Error reading cleanup history {json_path}: {e}")
-    return jsonify({"history": history})
+    # Entries only hold the summary fields, not the large per-file arrays
+    return catalog_response(cleanup_catalog(output_dir), "history")
 
 @routes.route("/get_cleanup_summary/<filename>")
 def get_cleanup_summary(filename):
@@ -302,9 +417,10 @@ def get_cleanup_summary(filename):
 
 @routes.route("/current_file_progress", methods=["GET"])
 def current_file_progress():
-    with CURRENT_FILE_PROGRESS.get_lock():
-        progress = CURRENT_FILE_PROGRESS.value
-    with CURRENT_FILE_NAME.get_lock():
-        filename = CURRENT_FILE_NAME.value.decode("utf-8").strip()
-    return jsonify({"progress": progress, "filename": filename})
+    """Per-file progress of the most recent cleanup."""
+    job = latest_cleanup_job()
+    if job is None:
+        return jsonify({"progress": 0, "filename": ""})
+    state = job.events.snapshot()[1]
+    return jsonify({"progress": state["file_percent"], "filename": state["current_file"]})
 
@@ -1,27 +1,50 @@
 ﻿# modules/scan.py
-import os, json, shutil
+import os, json, shutil, gzip
+from collections import namedtuple
 from pathlib import Path
 from datetime import datetime
 import csv
-from tqdm import tqdm
 from flask import current_app
-from multiprocessing import Value
-from time import time
+from time import time, monotonic, perf_counter
+from threading import Event, Lock
+from concurrent.futures import ThreadPoolExecutor
+from config import SCAN_WORKERS, HASH_CACHE_MAX_ENTRIES, SCAN_MEMORY_LIMIT_MB, SCAN_CHECKPOINT_SECONDS
+from modules.hashing import find_content_duplicates
+from modules.hash_cache import HashCache
+from modules.spill import SpillIndex
+from modules.records import FileRecord
+from modules.filters import PathFilter
+from modules.progress import ProgressChannel, ProgressReporter
+from modules.checkpoint import ScanCheckpoint, clean_old_checkpoints
+from modules.result_store import ResultStoreWriter, store_path_for
+from modules.catalog import scan_catalog
+from modules.metrics import RunMetrics, registry
+from modules.profiling import worker_initializer
 
-# Shared variables
-SCAN_PROGRESS = Value("i", 0)
-is_canceled = False
+# Bump when the snapshot layout changes so old snapshots are ignored
+SNAPSHOT_VERSION = 1
 
-def get_array_drives():
+# Stand-in for os.stat_result when a file comes from a snapshot
+FileStat = namedtuple("FileStat", ["st_size", "st_mtime_ns", "st_dev", "st_ino"])
+
+# Entries a disk walker collects before handing them to the spill index
+SPILL_BATCH_SIZE = 10000
+
+# Concurrent scans share the file counts and need distinct output names
+file_counts_lock = Lock()
+session_lock = Lock()
+sessions_in_use = set()
+
+def get_array_drives(root="/mnt"):
     return sorted(
-        str(p) for p in Path("/mnt").glob("disk*")
-        if p.is_dir() and not str(p).startswith("/mnt/disks")
+        str(p) for p in Path(root).glob("disk*")
+        if p.is_dir() and not p.name.startswith("disks")
     )
 
-def get_pool_drives():
+def get_pool_drives(root="/mnt"):
     excluded_mounts = {"addons", "remotes", "rootshare", "user", "user0", "disks"}
     return sorted(
-        str(p) for p in Path("/mnt").iterdir()
+        str(p) for p in Path(root).iterdir()
         if p.is_dir() and not p.name.startswith("disk") and p.name not in excluded_mounts
     )
 
@@ -31,17 +54,207 @@ def clean_old_csv_files(directory, keep_count=5):
         key=lambda f: f.stat().st_mtime,
         reverse=True
     )
+    removed = []
     for old_file in csv_files[keep_count:]:
         try:
-            # Delete the associated JSON file if it exists
-            json_file = old_file.with_suffix('.json')
-            if json_file.exists():
-                json_file.unlink()
-                print(f"Deleted associated JSON file: {json_file}")
+            # Delete the associated JSON file and result store if they exist
+            for related_file in (old_file.with_suffix('.json'), Path(store_path_for(str(old_file)))):
+                if related_file.exists():
+                    related_file.unlink()
+                    print(f"Deleted associated file: {related_file}")
+            removed.append(old_file.with_suffix('.json').name)
             old_file.unlink()
             print(f"Deleted old CSV file: {old_file}")
         except Exception as e:
             print(f"Error deleting file {old_file}: {e}")
+    if removed:
+        scan_catalog(directory).remove(removed)
+
+def reserve_session_name(output_dir, timestamp):
+    """Base name for a scan's CSV/JSON that no other scan started this second uses."""
+    with session_lock:
+        # Names from earlier seconds can't collide any more
+        sessions_in_use.difference_update(n for n in list(sessions_in_use) if not n.startswith(f"duplicates_{timestamp}"))
+        name = f"duplicates_{timestamp}"
+        suffix = 2
+        while name in sessions_in_use or os.path.exists(os.path.join(output_dir, name + ".csv")):
+            name = f"duplicates_{timestamp}_{suffix}"
+            suffix += 1
+        sessions_in_use.add(name)
+        return name
+
+def load_file_counts(counts_file):
+    """Load the per-disk file counts recorded by the previous scan."""
+    try:
+        with open(counts_file, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"Error reading file counts {counts_file}: {e}")
+        return {}
+
+def save_file_counts(counts_file, counts):
+    try:
+        with open(counts_file, "w") as f:
+            json.dump(counts, f, indent=2)
+    except Exception as e:
+        print(f"Error writing file counts {counts_file}: {e}")
+
+def estimate_file_count(disk, previous_counts):
+    """Cheap estimate of the number of files on a disk, used to drive progress."""
+    count = previous_counts.get(disk)
+    if count:
+        return count
+    try:
+        # Used inodes include directories, which is close enough for a progress bar
+        stats = os.statvfs(disk)
+        return max(stats.f_files - stats.f_ffree, 0)
+    except (OSError, AttributeError):
+        return 0
+
+def snapshot_path(snapshot_dir, disk):
+    return os.path.join(snapshot_dir, disk.strip("/").replace("/", "_") + ".json.gz")
+
+def load_snapshot(snapshot_dir, disk, filters=None):
+    """Load the directory snapshot saved by the previous scan of disk with the same filters."""
+    path = snapshot_path(snapshot_dir, disk)
+    try:
+        with gzip.open(path, "rt") as f:
+            snapshot = json.load(f)
+        if snapshot.get("version") != SNAPSHOT_VERSION or snapshot.get("disk") != disk:
+            return None
+        if snapshot.get("filters") != filters:
+            # Snapshots only hold the files that passed the filters they were taken with
+            return None
+        return snapshot["dirs"]
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Error reading snapshot {path}: {e}")
+        return None
+
+def save_snapshot(snapshot_dir, disk, dirs, filters=None):
+    path = snapshot_path(snapshot_dir, disk)
+    tmp_path = path + ".tmp"
+    try:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        with gzip.open(tmp_path, "wt", compresslevel=1) as f:
+            json.dump(
+                {"version": SNAPSHOT_VERSION, "disk": disk, "filters": filters, "dirs": dirs},
+                f, separators=(",", ":"),
+            )
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"Error writing snapshot {path}: {e}")
+
+def walk_files(disk, snapshot=None, new_snapshot=None, path_filter=None, stats=None, reused_dirs=None):
+    """Yield (full path, relative path, stat result) for every file below disk.
+
+    Uses a single os.scandir pass so the file type comes from the directory
+    entry and each file costs one stat call. When a snapshot from the previous
+    scan is given, directories whose mtime hasn't changed are not listed again
+    and their files are taken from the snapshot. new_snapshot, if given, is
+    filled with the snapshot for this walk. A PathFilter prunes excluded
+    directories and rejects files by name before they are stat'ed. stats, if
+    given, gets the stat calls, read errors and skipped files added to it
+    once the walk ends. reused_dirs, if given, gets the relative path of
+    every directory taken from the snapshot: an in-place overwrite doesn't
+    change a directory's mtime, so its files must be stat'ed again before
+    their size, mtime or inode is trusted.
+    """
+    stat_calls = errors = skipped = 0
+    stack = [(disk, "")]
+    try:
+        while stack:
+            current, rel_dir = stack.pop()
+            cached = snapshot.get(rel_dir) if snapshot else None
+            try:
+                tracked = snapshot is not None or new_snapshot is not None
+                if tracked:
+                    stat_calls += 1
+                dir_mtime_ns = os.stat(current).st_mtime_ns if tracked else None
+            except OSError as e:
+                print(f"Error reading directory {current}: {e}")
+                errors += 1
+                continue
+
+            if cached and cached[0] == dir_mtime_ns:
+                # Nothing was added, removed or renamed here since the last scan
+                if new_snapshot is not None:
+                    new_snapshot[rel_dir] = cached
+                if reused_dirs is not None:
+                    reused_dirs.add(rel_dir)
+                for name, size, mtime_ns, dev, ino in cached[2]:
+                    yield os.path.join(current, name), rel_dir + name, FileStat(size, mtime_ns, dev, ino)
+                stack.extend((os.path.join(current, name), rel_dir + name + os.sep) for name in reversed(cached[1]))
+                continue
+
+            try:
+                with os.scandir(current) as it:
+                    entries = list(it)
+            except OSError as e:
+                print(f"Error reading directory {current}: {e}")
+                errors += 1
+                continue
+            subdirs = []
+            files = []
+            for entry in entries:
+                rel_path = rel_dir + entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if path_filter and path_filter.excludes_dir(entry.name, rel_path):
+                            continue
+                        subdirs.append(entry.name)
+                        continue
+                    if path_filter and not path_filter.accepts_file(entry.name, rel_path):
+                        skipped += 1
+                        continue
+                    if not entry.is_file():
+                        print(f"Skipping non-file: {entry.path}")
+                        skipped += 1
+                        continue
+                    stat_calls += 1
+                    st = entry.stat()
+                except OSError as e:
+                    print(f"Error processing {entry.path}: {e}")
+                    errors += 1
+                    continue
+                if new_snapshot is not None:
+                    files.append([entry.name, st.st_size, st.st_mtime_ns, st.st_dev, st.st_ino])
+                yield entry.path, rel_path, st
+            if new_snapshot is not None:
+                new_snapshot[rel_dir] = [dir_mtime_ns, subdirs, files]
+            # Keep the top-down order of os.walk
+            stack.extend((os.path.join(current, name), rel_dir + name + os.sep) for name in reversed(subdirs))
+    finally:
+        # Also runs when the caller stops early, e.g. on cancel
+        if stats is not None:
+            stats["stat_calls"] = stats.get("stat_calls", 0) + stat_calls
+            stats["errors"] = stats.get("errors", 0) + errors
+            stats["skipped"] = stats.get("skipped", 0) + skipped
+
+def collapse_hardlinks(records):
+    """Split records into one per inode and the other paths of each inode.
+
+    Returns (files, links), links mapping a record of files to the records
+    that share its (st_dev, st_ino). Records without an inode number are
+    never merged.
+    """
+    files = []
+    links = {}
+    by_inode = {}
+    for record in records:
+        if not record.ino:
+            files.append(record)
+            continue
+        first = by_inode.get((record.dev, record.ino))
+        if first is None:
+            by_inode[(record.dev, record.ino)] = record
+            files.append(record)
+        else:
+            links.setdefault(first, []).append(record)
+    return files, links
 
 def format_size(size_in_bytes):
     units = ["bytes", "KB", "MB", "GB", "TB", "PB"]
@@ -52,17 +265,21 @@ def format_size(size_in_bytes):
         unit_index += 1
     return f"{size:,.2f} {units[unit_index]}"
 
-def scan_for_duplicates(selected_disks, min_size=None, ext_filter=None, keep_strategy_order=None, app=None):
+def scan_for_duplicates(selected_disks, min_size=None, ext_filter=None, keep_strategy_order=None, app=None, max_workers=None, verify_content=False, match_mode="path", incremental=True, memory_limit_mb=None, exclude_patterns=None, include_patterns=None, events=None, cancel_event=None, resume=False, keep_partial=False):
     session_timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    global is_canceled
-    is_canceled = False
+    events = events or ProgressChannel("scan")
+    cancel_event = cancel_event or Event()
+    is_canceled = cancel_event.is_set
 
     start_time = time()
+    metrics = RunMetrics()
 
     if app:
         with app.app_context():
             static_dir = os.path.join(current_app.root_path, "static", "output")
             scan_output_dir = os.path.join(static_dir, "scan_results")
+            snapshot_dir = os.path.join(static_dir, "snapshots")
+            checkpoint_dir = os.path.join(static_dir, "checkpoints")
             try:
                 os.makedirs(scan_output_dir, exist_ok=True)
             except Exception as e:
@@ -72,132 +289,433 @@ def scan_for_duplicates(selected_disks, min_size=None, ext_filter=None, keep_str
         raise RuntimeError("Application context is required to run this function.")
 
     file_index = {}
-    total_files = sum(len(files) for disk in selected_disks for _, _, files in os.walk(disk))
-    processed_files = 0
 
-    with SCAN_PROGRESS.get_lock():
-        SCAN_PROGRESS.value = 1  # Show early progress immediately
+    # Estimate the workload up front instead of walking every disk twice
+    counts_file = os.path.join(scan_output_dir, "file_counts.json")
+    previous_counts = load_file_counts(counts_file)
+    disk_estimates = {disk: estimate_file_count(disk, previous_counts) for disk in selected_disks}
+    total_files = max(sum(disk_estimates.values()), 1)
+    disk_counts = {}
 
-    if total_files == 0:
-        SCAN_PROGRESS.value = 100
-        print("No files found to scan.")
-        return None
+    events.update(phase="walking", percent=1)  # Show early progress immediately
 
     total_duplicate_files = 0
     total_duplicate_size = 0
+    hardlinks_collapsed = 0
     disks_with_duplicates = set()
     drive_summary = {}
 
-    def get_drive_free_space(path):
-        """Helper function to get the available space on a drive."""
-        try:
-            total, used, free = shutil.disk_usage(path)
-            return free
-        except Exception as e:
-            print(f"Error getting free space for {path}: {e}")
-            return 0
-
-    def sort_by_strategy(paths, strategy):
-        """Sort paths based on a single strategy."""
-        if strategy == "newest":
-            return sorted(paths, key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0, reverse=True)
-        elif strategy == "oldest":
-            return sorted(paths, key=lambda p: os.path.getmtime(p) if os.path.exists(p) else float("inf"))
-        elif strategy == "largest":
-            return sorted(paths, key=lambda p: os.path.getsize(p) if os.path.exists(p) else 0, reverse=True)
-        elif strategy == "smallest":
-            return sorted(paths, key=lambda p: os.path.getsize(p) if os.path.exists(p) else float("inf"))
-        elif strategy == "least_space":
-            return sorted(paths, key=lambda p: get_drive_free_space(os.path.dirname(p)), reverse=False)
-        elif strategy == "most_space":
-            return sorted(paths, key=lambda p: get_drive_free_space(os.path.dirname(p)), reverse=True)
-        return paths
-
-    with tqdm(total=total_files, desc="Scanning files", unit="file") as pbar:
-        for disk in selected_disks:
-            for root, _, files in os.walk(disk):
-                if is_canceled:
-                    print("Scan canceled.")
-                    return None
-                for file in files:
-                    if is_canceled:
-                        print("Scan canceled.")
-                        return None
-                    file_path = os.path.join(root, file)
-
-                    if not os.path.isfile(file_path):
-                        print(f"Skipping non-file: {file_path}")
-                        continue
+    free_space_cache = {}
 
-                    try:
-                        if min_size and os.path.getsize(file_path) < min_size:
-                            continue
-                        if ext_filter and "*" not in ext_filter:
-                            if not any(file.lower().endswith(ext.lower()) for ext in ext_filter):
-                                continue
-                        rel_path = os.path.relpath(file_path, disk)
-                        file_index.setdefault(rel_path, []).append(file_path)
-                    except Exception as e:
-                        print(f"Error processing {file_path}: {e}")
-                    finally:
-                        processed_files += 1
-                        with SCAN_PROGRESS.get_lock():
-                            SCAN_PROGRESS.value = int((processed_files / total_files) * 100)
-                        pbar.update(1)
-
-    if is_canceled:
-        print("Scan canceled after file walk.")
+    def get_drive_free_space(disk):
+        """Available space on a drive, looked up once per scan."""
+        if disk not in free_space_cache:
+            try:
+                total, used, free = shutil.disk_usage(disk)
+                free_space_cache[disk] = free
+            except Exception as e:
+                print(f"Error getting free space for {disk}: {e}")
+                free_space_cache[disk] = 0
+        return free_space_cache[disk]
+
+    # Each strategy maps a record to a value where smaller sorts first (is kept)
+    strategy_keys = {
+        "newest": lambda r: -r.mtime_ns,
+        "oldest": lambda r: r.mtime_ns,
+        "largest": lambda r: -r.size,
+        "smallest": lambda r: r.size,
+        "least_space": lambda r: get_drive_free_space(selected_disks[r.disk_id]),
+        "most_space": lambda r: -get_drive_free_space(selected_disks[r.disk_id]),
+    }
+
+    def sort_by_strategy(entries, strategy_order):
+        """Rank records with one composite key, the first strategy taking priority."""
+        key_funcs = [strategy_keys[s] for s in strategy_order or [] if s in strategy_keys]
+        if not key_funcs:
+            return list(entries)
+        return sorted(entries, key=lambda e: tuple(k(e) for k in key_funcs))
+
+    def spill_entries(disk_index, entries, seq_start):
+        """Hand a batch of records to the spill index, keyed like file_index."""
+        if match_mode == "content":
+            records = ((r.size, disk_index, seq_start + i, r) for i, r in enumerate(entries) if r.size > 0)
+        else:
+            records = ((r.rel_path, disk_index, seq_start + i, r) for i, r in enumerate(entries))
+        spill_index.add_many(records)
+
+    def scan_percent(files, _bytes):
+        """Called by the reporter under its lock."""
+        nonlocal total_files
+        if files >= total_files:
+            # The estimate was too low, keep the bar moving without reaching 100%
+            total_files = int(files * 1.1) + 1
+            reporter.set_total(total_files)
+        return max(1, min(int((files / total_files) * 100), 99))
+
+    def scan_disk(disk_index, disk):
+        """Walk a single disk and return its FileRecords.
+
+        In memory-bounded mode entries are handed to the spill index in batches
+        and an empty list is returned.
+        """
+        nonlocal total_files
+        entries = []
+        disk_files = 0
+        disk_bytes = 0
+        disk_errors = 0
+        too_small = 0
+        spilled = 0
+        canceled = False
+        walk_stats = {}
+        disk_start = perf_counter()
+        # Snapshots grow with the file count, so they are skipped when memory is bounded
+        snapshot = load_snapshot(snapshot_dir, disk, filter_signature) if incremental and not spill_index else None
+        finished_dirs = None
+        if resume and checkpoint:
+            finished_dirs, _ = checkpoint.load_disk(disk)
+            if finished_dirs:
+                # Directories finished before the interruption are newer than the last snapshot
+                print(f"Resuming {disk} from checkpoint ({len(finished_dirs):,} directories done)")
+                snapshot = {**(snapshot or {}), **finished_dirs}
+        new_snapshot = None if spill_index else {}
+
+        def save_checkpoint(complete=False):
+            # Directories from the previous run that weren't reached again are still done
+            dirs = {**finished_dirs, **new_snapshot} if finished_dirs and not complete else new_snapshot
+            checkpoint.save_disk(disk, dirs, complete)
+
+        next_checkpoint = monotonic() + checkpoint.interval if checkpoint else None
+        walker = walk_files(disk, snapshot, new_snapshot, walk_filter, walk_stats, reused_dirs[disk_index])
+        for file_path, rel_path, st in walker:
+            if is_canceled():
+                canceled = True
+                break
+            if checkpoint and monotonic() >= next_checkpoint:
+                # The directory being walked is only added once all its files are out
+                save_checkpoint()
+                next_checkpoint = monotonic() + checkpoint.interval
+            try:
+                size = st.st_size
+                disk_bytes += size
+                if min_size and size < min_size:
+                    too_small += 1
+                    continue
+                entries.append(FileRecord(disk_index, rel_path, size, st.st_mtime_ns, st.st_dev, st.st_ino))
+                if spill_index and len(entries) >= SPILL_BATCH_SIZE:
+                    spill_entries(disk_index, entries, spilled)
+                    spilled += len(entries)
+                    entries = []
+            except Exception as e:
+                print(f"Error processing {file_path}: {e}")
+                disk_errors += 1
+            finally:
+                disk_files += 1
+                reporter.add(st.st_size, file_path)
+        walker.close()
+        metrics.add_disk(
+            disk, files=disk_files, nbytes=disk_bytes, seconds=perf_counter() - disk_start,
+            stat_calls=walk_stats.get("stat_calls", 0),
+            errors=walk_stats.get("errors", 0) + disk_errors,
+            skipped=walk_stats.get("skipped", 0) + too_small,
+        )
+        snapshot = None
+        if checkpoint:
+            save_checkpoint(complete=not canceled)
+        if canceled:
+            reporter.flush()
+            # Keep what was walked only when a partial CSV was asked for
+            if not keep_partial:
+                return None
+        elif new_snapshot is not None:
+            save_snapshot(snapshot_dir, disk, new_snapshot, filter_signature)
+        if spill_index:
+            spill_entries(disk_index, entries, spilled)
+            entries = []
+        if canceled:
+            return entries
+        reporter.flush()
+        with reporter.lock:
+            # Replace the estimate for this disk with the real count
+            disk_counts[disk] = disk_files
+            total_files = max(total_files - disk_estimates[disk] + disk_files, reporter.files, 1)
+            reporter.set_total(total_files)
+        return entries
+
+    # Compile include/exclude/extension rules once for every walker
+    path_filter = PathFilter(exclude=exclude_patterns, include=include_patterns, extensions=ext_filter)
+    walk_filter = path_filter if path_filter.active else None
+    # Directories each walker took from its snapshot, their files are stat'ed again only if they become candidates
+    reused_dirs = [set() for _ in selected_disks]
+    filter_signature = path_filter.signature if path_filter.active else None
+
+    # One walker per disk, each disk is its own spindle on Unraid
+    workers = max(1, min(max_workers or SCAN_WORKERS, len(selected_disks)))
+    # Counts are batched per walker and published every few hundred milliseconds
+    reporter = ProgressReporter(
+        channel=events, percent=scan_percent,
+        desc="Scanning files", total=total_files,
+    )
+    memory_limit_mb = SCAN_MEMORY_LIMIT_MB if memory_limit_mb is None else memory_limit_mb
+    spill_index = SpillIndex.for_memory_limit(static_dir, memory_limit_mb) if memory_limit_mb else None
+    # Checkpoints hold every walked directory, so like snapshots they need the in-memory index
+    checkpoint = None
+    if SCAN_CHECKPOINT_SECONDS > 0 and not spill_index:
+        checkpoint = ScanCheckpoint(checkpoint_dir, {
+            "disks": list(selected_disks),
+            "filters": filter_signature,
+            "min_size": min_size or 0,
+            "match_mode": match_mode,
+        }, SCAN_CHECKPOINT_SECONDS)
+        if resume and not checkpoint.exists():
+            print("No checkpoint found for these scan settings, starting from the beginning.")
+    walk_start = perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers, initializer=worker_initializer()) as executor:
+            futures = [executor.submit(scan_disk, i, disk) for i, disk in enumerate(selected_disks)]
+            # Merge in disk order so results don't depend on which walker finished first
+            for disk, future in zip(selected_disks, futures):
+                try:
+                    entries = future.result()
+                except Exception as e:
+                    print(f"Error scanning disk {disk}: {e}")
+                    continue
+                if entries is None:
+                    continue
+                for record in entries:
+                    if match_mode != "content":
+                        group = file_index.get(record.rel_path)
+                        if group is None:
+                            file_index[record.rel_path] = [record]
+                        else:
+                            # Share one relative path string across the group
+                            record.rel_path = group[0].rel_path
+                            group.append(record)
+                    elif record.size > 0:
+                        # Keep a bare record per size and only build a list once sizes collide
+                        existing = file_index.get(record.size)
+                        if existing is None:
+                            file_index[record.size] = record
+                        elif isinstance(existing, list):
+                            existing.append(record)
+                        else:
+                            file_index[record.size] = [existing, record]
+    finally:
+        reporter.close()
+        metrics.add_time("walk", perf_counter() - walk_start)
+
+    if match_mode == "content" and not spill_index:
+        # Files with a unique size can't have a duplicate, drop them before hashing
+        with metrics.phase("group"):
+            file_index = {size: entries for size, entries in file_index.items() if isinstance(entries, list)}
+
+    walk_canceled = is_canceled()
+    if walk_canceled and (not keep_partial or match_mode == "content"):
+        # Content matches need hashing, so nothing from an unfinished walk is confirmed yet
+        print("Scan canceled." + (" Resume it from the checkpoint." if checkpoint else ""))
+        if spill_index:
+            spill_index.close()
+        registry.record_scan(metrics, "canceled")
         return None
 
-    csv_file = Path(scan_output_dir) / f"duplicates_{session_timestamp}.csv"
+    if walk_canceled:
+        print("Scan canceled, writing partial results from the files walked so far.")
+        # The walk stopped early, path groups are written without hashing them first
+        verify_content = False
+        stop_matching = lambda: False
+    else:
+        stop_matching = is_canceled
+
+    with file_counts_lock:
+        # Re-read so counts saved by a scan of other disks in the meantime are kept
+        counts = load_file_counts(counts_file)
+        counts.update(disk_counts)
+        save_file_counts(counts_file, counts)
+
+    if reporter.files == 0:
+        print("No files found to scan.")
+        if checkpoint and not walk_canceled:
+            checkpoint.clear()
+        if spill_index:
+            spill_index.close()
+        registry.record_scan(metrics, "empty")
+        return None
+
+    session_name = reserve_session_name(scan_output_dir, session_timestamp)
+    csv_file = Path(scan_output_dir) / f"{session_name}.csv"
+    # Records refer to disks by index, names are resolved once here
+    drive_names = [os.path.basename(os.path.normpath(disk)) or "unknown" for disk in selected_disks]
     group_id = 1
     duplicates_found = False
+    store = None
+
+    def refresh_reused(entries):
+        """Stat records from directories taken from a snapshot again, dropping files that are gone.
+
+        Only files that reach hashing pay for this, a snapshot hit still
+        saves the stat of every other file.
+        """
+        fresh = []
+        for record in entries:
+            dirs = reused_dirs[record.disk_id]
+            if dirs and record.rel_path[:record.rel_path.rfind(os.sep) + 1] in dirs:
+                file_path = record.full_path(selected_disks)
+                try:
+                    st = os.stat(file_path)
+                except OSError as e:
+                    print(f"Error processing {file_path}: {e}")
+                    continue
+                record.size = st.st_size
+                record.mtime_ns = st.st_mtime_ns
+                record.dev = st.st_dev
+                record.ino = st.st_ino
+            fresh.append(record)
+        return fresh
 
-    for rel_path, paths in file_index.items():
-        if len(paths) > 1:
-            if not duplicates_found:
-                # Only open and write the CSV header if we find the first duplicate group
-                f = open(csv_file, "w", newline="")
-                writer = csv.writer(f)
-                writer.writerow(["Group", "Relative Path", "Full Path", "Modification Time", "Size", "Keep"])
-                duplicates_found = True
+    def candidate_groups():
+        """Yield (entries, verification status, hardlinks) for each duplicate group.
+
+        entries holds one record per inode, hardlinks maps a record to the
+        other paths of its inode, so each inode is hashed once.
+        """
+        nonlocal hardlinks_collapsed
+        for entries in (spill_index.groups() if spill_index else file_index.values()):
+            if len(entries) < 2:
+                continue
+            entries, links = collapse_hardlinks(entries)
+            hardlinks_collapsed += sum(len(paths) for paths in links.values())
+            if len(entries) < 2:
+                # Every path is the same file, its space is only used once
+                continue
+            if not verify_content and match_mode != "content":
+                yield entries, "unverified", links
+                continue
+            # A stale size or mtime would hit the hash cache for content that has changed
+            entries = refresh_reused(entries)
+            if len(entries) < 2:
+                continue
+            groups = find_content_duplicates(
+                [(r.full_path(selected_disks), r.size, r.cache_key, r) for r in entries],
+                is_canceled=stop_matching,
+                cache=hash_cache,
+            )
+            for group in groups or []:
+                yield [item[3] for item in group], "verified", links
+
+    hash_cache = None
+    if verify_content or match_mode == "content":
+        try:
+            hash_cache = HashCache(os.path.join(static_dir, "hash_cache.sqlite3"), HASH_CACHE_MAX_ENTRIES)
+        except Exception as e:
+            print(f"Error opening hash cache, hashing without it: {e}")
+
+    events.update(phase="matching", current_file="")
+    # Hashing happens while groups are produced, so it is part of the group phase
+    for entries, verified, links in metrics.timed(candidate_groups(), "group"):
+        if stop_matching():
+            break
+        events.update(current_file=entries[0].full_path(selected_disks))
+        if not duplicates_found:
+            # Only open and write the CSV header if we find the first duplicate group
+            f = open(csv_file, "w", newline="")
+            writer = csv.writer(f)
+            writer.writerow(["Group", "Relative Path", "Full Path", "Modification Time", "Size", "Keep", "Verified", "Hardlink Of"])
+            duplicates_found = True
             try:
-                # Apply strategies in the specified order
-                for strategy in keep_strategy_order:
-                    paths = sort_by_strategy(paths, strategy)
+                # Indexed copy of the groups for paging through results and streaming cleanups
+                store = ResultStoreWriter(store_path_for(str(csv_file)))
             except Exception as e:
-                print(f"Error sorting paths for {rel_path}: {e}")
-                continue
+                print(f"Error creating result store, writing the CSV only: {e}")
+        try:
+            # Sizes and mtimes come from the walk, so ranking needs no new stat calls
+            with metrics.phase("sort"):
+                entries = sort_by_strategy(entries, keep_strategy_order)
+        except Exception as e:
+            print(f"Error sorting paths for {entries[0].rel_path}: {e}")
+            continue
 
-            for path in paths:
-                if not os.path.exists(path):
-                    continue
+        write_start = perf_counter()
+        store_rows = []
+        for index, record in enumerate(entries):
+            keep = "yes" if index == 0 else "no"
+            # Other paths of the same inode share its Keep value but take no space of their own
+            inode_path = None
+            for path_record in [record] + links.get(record, []):
                 try:
-                    parts = os.path.normpath(path).split(os.sep)
-                    drive = parts[2] if len(parts) > 2 else "unknown"
+                    drive = drive_names[path_record.disk_id]
                     disks_with_duplicates.add(drive)
-                    if path != paths[0]:
+                    if index > 0 and inode_path is None:
                         drive_summary.setdefault(drive, {"file_count": 0, "total_size": 0})
                         drive_summary[drive]["file_count"] += 1
-                        drive_summary[drive]["total_size"] += os.path.getsize(path)
+                        drive_summary[drive]["total_size"] += record.size
                         total_duplicate_files += 1
-                        total_duplicate_size += os.path.getsize(path)
+                        total_duplicate_size += record.size
 
-                    mod_time = os.path.getmtime(path)
-                    size = os.path.getsize(path)
-                    keep = "yes" if path == paths[0] else "no"
-                    writer.writerow([group_id, rel_path, path, mod_time, size, keep])
+                    full_path = path_record.full_path(selected_disks)
+                    mtime = path_record.mtime
+                    writer.writerow([
+                        group_id, path_record.rel_path, full_path, mtime, path_record.size, keep, verified,
+                        inode_path or "",
+                    ])
+                    store_rows.append((
+                        path_record.rel_path, full_path, selected_disks[path_record.disk_id], drive,
+                        mtime, path_record.size, index == 0, inode_path is not None,
+                    ))
+                    if inode_path is None:
+                        inode_path = full_path
                 except Exception as e:
-                    print(f"Error writing data for {path}: {e}")
-            group_id += 1
+                    print(f"Error writing data for {path_record.rel_path}: {e}")
+        if store and store_rows:
+            try:
+                store.add_group(group_id, store_rows, verified)
+            except Exception as e:
+                print(f"Error writing result store, writing the CSV only: {e}")
+                store.abort()
+                store = None
+        metrics.add_time("csv_write", perf_counter() - write_start)
+        group_id += 1
 
     if duplicates_found:
         f.close()
 
+    if spill_index:
+        spill_index.close()
+
+    if hash_cache:
+        try:
+            if not is_canceled():
+                hash_cache.prune()
+            hash_cache.close()
+        except Exception as e:
+            print(f"Error updating hash cache: {e}")
+
+    partial = is_canceled()
+    if partial and not keep_partial:
+        print("Scan canceled during verification.")
+        if duplicates_found:
+            csv_file.unlink(missing_ok=True)
+        if store:
+            store.abort()
+        registry.record_scan(metrics, "canceled")
+        return None
+
+    if store:
+        try:
+            with metrics.phase("csv_write"):
+                store.finish()
+        except Exception as e:
+            print(f"Error writing result store {store.path}: {e}")
+            store.abort()
+
+    if checkpoint and not partial:
+        # Ran to the end, nothing left to resume
+        checkpoint.clear()
+    if checkpoint:
+        clean_old_checkpoints(checkpoint_dir, keep_count=5)
+
+    scan_status = "partial" if partial else "done"
     if total_duplicate_files == 0:
         print("No duplicate files found. Returning empty summary.")
-        with SCAN_PROGRESS.get_lock():
-            SCAN_PROGRESS.value = 100
+        registry.record_scan(metrics, scan_status)
         return {
             "csv_file": None,
             "total_duplicates": "0",
@@ -206,8 +724,13 @@ def scan_for_duplicates(selected_disks, min_size=None, ext_filter=None, keep_str
             "drive_summary": {},
             "time_taken": float(time() - start_time),
             "time_completed": datetime.now().strftime("%m/%d/%Y %I:%M:%S %p"),
+            "partial": partial,
+            "hardlinks_collapsed": hardlinks_collapsed,
+            "metrics": metrics.as_dict(),
         }
 
+    events.update(phase="finalizing", current_file="")
+    summary_start = perf_counter()
     clean_old_csv_files(scan_output_dir, keep_count=5)
     time_taken = time() - start_time
 
@@ -215,8 +738,9 @@ def scan_for_duplicates(selected_disks, min_size=None, ext_filter=None, keep_str
     for drive in drive_summary:
         drive_summary[drive]["total_size"] = format_size(drive_summary[drive]["total_size"])
 
-    with SCAN_PROGRESS.get_lock():
-        SCAN_PROGRESS.value = 100
+    if partial:
+        print("⚠️ Scan canceled, partial results saved to:", csv_file)
+    else:
         print("✅ Duplicate detection complete. Results saved to:", csv_file)
 
     summary = {
@@ -228,14 +752,25 @@ def scan_for_duplicates(selected_disks, min_size=None, ext_filter=None, keep_str
         "time_taken": float(time_taken),
         "time_completed": datetime.now().strftime("%m/%d/%Y %I:%M:%S %p"),
         "keep_strategy": keep_strategy_order,
+        "verify_content": bool(verify_content or match_mode == "content"),
+        "match_mode": match_mode,
+        "incremental": bool(incremental),
+        "exclude_patterns": path_filter.signature["exclude"],
+        "include_patterns": path_filter.signature["include"],
+        "partial": partial,
+        "hardlinks_collapsed": hardlinks_collapsed,
     }
+    metrics.add_time("summary", perf_counter() - summary_start)
+    summary["metrics"] = metrics.as_dict()
+    registry.record_scan(metrics, scan_status)
 
     # Write summary JSON file
-    json_file = Path(scan_output_dir) / f"duplicates_{session_timestamp}.json"
+    json_file = Path(scan_output_dir) / f"{session_name}.json"
     try:
         with open(json_file, "w") as jf:
             json.dump(summary, jf, indent=2)
         print("✅ Scan summary JSON saved to:", json_file)
+        scan_catalog(scan_output_dir).add(json_file.name, summary)
     except Exception as e:
         print(f"Error writing JSON summary: {e}")
 
@@ -0,0 +1,72 @@
+# modules/spill.py
+import os, json, heapq, shutil, tempfile
+from threading import Lock
+from modules.records import FileRecord
+
+# Rough in-memory cost of one buffered record (FileRecord, its relative path and the sort tuple)
+RECORD_BYTES_ESTIMATE = 384
+
+class SpillIndex:
+    """Memory-bounded grouping of scan records using an external sort.
+
+    Records are buffered until max_records is reached, then sorted and written
+    to a run file on disk. groups() merges all runs and yields the records that
+    share a key, so only one group is held in memory at a time.
+    """
+
+    def __init__(self, parent_dir, max_records):
+        self.max_records = max(int(max_records), 1000)
+        self.spill_dir = tempfile.mkdtemp(prefix="scan_spill_", dir=parent_dir)
+        self.buffer = []
+        self.runs = []
+        self.lock = Lock()
+
+    @classmethod
+    def for_memory_limit(cls, parent_dir, memory_limit_mb):
+        return cls(parent_dir, memory_limit_mb * 1024 * 1024 // RECORD_BYTES_ESTIMATE)
+
+    def add_many(self, records):
+        """Add (key, disk index, sequence, FileRecord) records."""
+        with self.lock:
+            self.buffer.extend(records)
+            if len(self.buffer) >= self.max_records:
+                self._spill()
+
+    def _spill(self):
+        if not self.buffer:
+            return
+        self.buffer.sort(key=lambda r: (r[0], r[1], r[2]))
+        run_path = os.path.join(self.spill_dir, f"run_{len(self.runs):05d}.jsonl")
+        with open(run_path, "w", encoding="utf-8") as f:
+            for key, disk_index, seq, record in self.buffer:
+                f.write(json.dumps((key, disk_index, seq, record.as_tuple()), separators=(",", ":")))
+                f.write("\n")
+        self.runs.append(run_path)
+        self.buffer = []
+
+    def _read_run(self, run_path):
+        with open(run_path, "r", encoding="utf-8") as f:
+            for line in f:
+                key, disk_index, seq, record = json.loads(line)
+                yield key, disk_index, seq, FileRecord(*record)
+
+    def groups(self):
+        """Yield lists of records sharing a key, skipping keys seen only once."""
+        with self.lock:
+            self._spill()
+        merged = heapq.merge(*(self._read_run(run) for run in self.runs), key=lambda r: (r[0], r[1], r[2]))
+        current_key = None
+        group = []
+        for key, _, _, record in merged:
+            if key != current_key:
+                if len(group) > 1:
+                    yield group
+                current_key = key
+                group = []
+            group.append(record)
+        if len(group) > 1:
+            yield group
+
+    def close(self):
+        self.buffer = []
+        shutil.rmtree(self.spill_dir, ignore_errors=True)